@@ -0,0 +1,17 @@
+# **********************************************
+# * Garage Opener - Rasperry Pico W
+# * boot.py
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+import os
+import storage
+
+# The persistent history log (history_log = "True" in settings.toml)
+# needs the filesystem writable from code.py. While remounted, the
+# CIRCUITPY drive is read-only from the host: to edit files over USB
+# again, boot in safe mode (boot.py is skipped) or set history_log to
+# "False" from the REPL.
+if os.getenv("history_log") == "True":
+    storage.remount("/", readonly=False)
+    print("Filesystem writable from code.py for history log.")
@@ -1,13 +1,15 @@
 # **********************************************
 # * Garage Opener - Rasperry Pico W
-# * v2025.03.19.1
+# * v2026.10.18.1
 # * By: Nicola Ferralis <feranick@hotmail.com>
 # **********************************************
 
-version = "2026.03.19.1"
+version = "2026.10.18.1"
 
 import wifi
 import time
+# Start of the boot timings reported at /api/boot
+boot_start = time.monotonic()
 import microcontroller
 import supervisor
 import os
@@ -15,20 +17,20 @@ import busio
 import board
 import digitalio
 import socketpool
-import ssl
 import json
+import errno
+import struct
+import binascii
+import gc
+from array import array
 
-import adafruit_requests
-from adafruit_httpserver import Server, MIMETypes, Response, FileResponse
-
-import adafruit_ntp
+from adafruit_httpserver import Server, Request, MIMETypes, Response, FileResponse, ChunkedResponse, Websocket, Status, POST, BAD_REQUEST_400, FORBIDDEN_403, NOT_FOUND_404, SERVICE_UNAVAILABLE_503
 
 from libSensors import SensorDevices, overclock
 
 DOOR_SIGNAL = board.GP22
 
 # HCSR04 - SONAR
-import adafruit_hcsr04
 SONAR_TRIGGER = board.GP15
 SONAR_ECHO = board.GP14
 
@@ -81,15 +83,33 @@ class Conf:
             self.sensor1_correct_temp = "False"
             print(f"Warning: Invalid settings.toml. Using default.")
 
+        try:
+            self.sonar_hysteresis = float(os.getenv("sonar_hysteresis"))
+            self.sonar_fast_interval = float(os.getenv("sonar_fast_interval"))
+            self.sonar_slow_interval = float(os.getenv("sonar_slow_interval"))
+        except (TypeError, ValueError):
+            self.sonar_hysteresis = 2.0
+            self.sonar_fast_interval = 0.25
+            self.sonar_slow_interval = 5.0
+            print("Warning: Invalid sonar sampling settings in settings.toml. Using default.")
+
+        try:
+            self.env_sample_interval = float(os.getenv("env_sample_interval"))
+        except (TypeError, ValueError):
+            self.env_sample_interval = 10.0
+            print("Warning: Invalid env_sample_interval in settings.toml. Using default.")
+
 ############################
 # Server
 ############################
 class GarageServer:
-    def __init__(self, control, sensors):
+    def __init__(self, control, sensors, boot):
         self.control = control
         self.sensors = sensors
+        self.boot = boot
         try:
-            self.remote_sensor_ip = os.getenv("remote_sensor_ip").split(',')
+            # Optional: remotes found by discovery need not be listed here
+            self.remote_sensor_ip = [ip.strip() for ip in (os.getenv("remote_sensor_ip") or "").split(',') if ip.strip()]
             self.sonar_location = os.getenv("sonar_location")
             self.station = os.getenv("station")
             self.zipcode = os.getenv("zipcode")
@@ -98,7 +118,7 @@ class GarageServer:
             print(f"\nRemote sensors IP: {self.remote_sensor_ip}")
         except KeyError: # If a key is not in os.environ (e.g. missing in settings.toml)
             print("A required setting was not found in settings.toml, using defaults.")
-            self.remote_sensor_ip = ["192.168.1.207","192.168.1.208","192.168.1.206"]
+            self.remote_sensor_ip = []
             self.sonar_location = "loc"
             self.station = "kbos"
             self.zipcode = "02139"
@@ -107,14 +127,148 @@ class GarageServer:
         except Exception as e:
             print(f"Error reading settings: {e}")
 
-        self.ntp = None
+        try:
+            self.remote_max_age = float(os.getenv("remote_max_age"))
+            self.remote_refresh_interval = float(os.getenv("remote_refresh_interval"))
+            self.remote_timeout = float(os.getenv("remote_timeout"))
+            self.remote_max_backoff = float(os.getenv("remote_max_backoff"))
+        except (TypeError, ValueError):
+            self.remote_max_age = 30.0
+            self.remote_refresh_interval = 20.0
+            self.remote_timeout = 3.0
+            self.remote_max_backoff = 300.0
+            print("Warning: Invalid remote cache timing in settings.toml. Using default.")
+
+        try:
+            self.max_remotes = int(os.getenv("max_remotes"))
+            self.discovery_interval = float(os.getenv("discovery_interval"))
+        except (TypeError, ValueError):
+            self.max_remotes = 6
+            self.discovery_interval = 300.0
+            print("Warning: Invalid discovery settings in settings.toml. Using default.")
+
+        # Polled remotes count as alive for three refresh intervals after
+        # their last answer; announced ones for three announce intervals.
+        self.registry = RemoteRegistry(self.remote_sensor_ip, self.max_remotes,
+                                       3 * self.remote_refresh_interval)
+        # Silent remotes are retried every discovery_interval; remotes
+        # marked down are probed at most remote_max_backoff apart
+        self.remote_cache = RemoteCache(self.registry,
+                                        self.remote_max_age,
+                                        self.remote_refresh_interval,
+                                        self.discovery_interval,
+                                        self.remote_max_backoff)
+
+        try:
+            self.history_size = int(os.getenv("history_size"))
+            self.history_decimation = int(os.getenv("history_decimation"))
+        except (TypeError, ValueError):
+            self.history_size = 720
+            self.history_decimation = 6
+            print("Warning: Invalid history settings in settings.toml. Using default.")
+
+        self.history = HistoryStore(self.history_size, self.history_decimation)
+
+        try:
+            self.telemetry_port = int(os.getenv("telemetry_port"))
+        except (TypeError, ValueError):
+            self.telemetry_port = 5005
+            print("Warning: Invalid telemetry_port in settings.toml. Using default.")
+        self.telemetry = None
+        self.discovery = None
+
+        try:
+            self.http_slots = int(os.getenv("http_slots"))
+            self.http_timeout = float(os.getenv("http_timeout"))
+        except (TypeError, ValueError):
+            self.http_slots = 4
+            self.http_timeout = 5.0
+            print("Warning: Invalid HTTP connection settings in settings.toml. Using default.")
+        self.connections = None
+
+        try:
+            self.ws_max_clients = int(os.getenv("ws_max_clients"))
+        except (TypeError, ValueError):
+            self.ws_max_clients = 3
+        self.push = PushChannel(self.ws_max_clients)
+        self.remote_cache.listener = self.onRemoteUpdate
+
+        try:
+            self.static_cache_budget = int(os.getenv("static_cache_budget"))
+            self.static_cache_max_file = int(os.getenv("static_cache_max_file"))
+            self.static_cache_min_free = int(os.getenv("static_cache_min_free"))
+        except (TypeError, ValueError):
+            self.static_cache_budget = 16384
+            self.static_cache_max_file = 8192
+            self.static_cache_min_free = 40000
+            print("Warning: Invalid static cache settings in settings.toml. Using default.")
+        self.static = None
+
+        # Door notifications through the mail backend; disabled without mail_url
+        self.mail_url = os.getenv("mail_url") or ""
+        self.mail_api_key = os.getenv("mail_api_key") or ""
+        self.mail_recipient = os.getenv("mail_recipient") or ""
+        try:
+            self.mail_outbox_size = int(os.getenv("mail_outbox_size"))
+            self.mail_batch_delay = float(os.getenv("mail_batch_delay"))
+            self.mail_timeout = float(os.getenv("mail_timeout"))
+            self.door_open_alert = float(os.getenv("door_open_alert"))
+        except (TypeError, ValueError):
+            self.mail_outbox_size = 10
+            self.mail_batch_delay = 30.0
+            self.mail_timeout = 5.0
+            self.door_open_alert = 15.0
+            print("Warning: Invalid notification settings in settings.toml. Using default.")
+        self.outbox = MailOutbox(self.mail_url, self.mail_api_key, self.mail_recipient,
+                                 self.mail_outbox_size, self.mail_batch_delay, self.mail_timeout,
+                                 lambda: self.clock.utc_ns() // 1_000_000_000)
+        self.door_watch = DoorWatch(self.outbox, self.door_open_alert * 60)
+
+        # Optional persistent log; needs the filesystem writable (see boot.py)
+        self.history_log = None
+        if os.getenv("history_log") == "True":
+            try:
+                log_settings = (int(os.getenv("history_log_segment_size")),
+                                int(os.getenv("history_log_segments")),
+                                int(os.getenv("history_log_batch")))
+            except (TypeError, ValueError):
+                log_settings = (4096, 4, 30)
+                print("Warning: Invalid history log settings in settings.toml. Using default.")
+            try:
+                self.history_log = HistoryLog("/history", *log_settings)
+            except OSError as e:
+                print(f"History log disabled, filesystem not writable: {e}")
+
+        try:
+            self.ntp_resync_interval = float(os.getenv("ntp_resync_interval"))
+        except (TypeError, ValueError):
+            self.ntp_resync_interval = 3600.0
+            print("Warning: Invalid ntp_resync_interval in settings.toml. Using default.")
+        self.clock = Clock(self.ntp_resync_interval)
+        self.sensors.envSampler.clock = self.clock
+        self.requests = None
         self.server = None
         self.ip = "0.0.0.0"
+        self.loop = LoopScheduler()
 
+        try:
+            self.wifi_reboot_after = float(os.getenv("wifi_reboot_after"))
+        except (TypeError, ValueError):
+            self.wifi_reboot_after = 300.0
+            print("Warning: Invalid wifi_reboot_after in settings.toml. Using default.")
+        self.link = WifiReconnect(os.getenv('CIRCUITPY_WIFI_SSID'),
+                                  os.getenv('CIRCUITPY_WIFI_PASSWORD'),
+                                  self.wifi_reboot_after)
+        self.link.on_down = self.network_down
+        self.link.on_up = self.network_up
+        self.link.on_give_up = self.reboot
+
+        # NTP is set up in serve_forever(), once the server is listening
         try:
             self.connect_wifi()
+            self.boot.mark("wifi")
             self.setup_server()
-            self.setup_ntp()
+            self.boot.mark("server")
             print("\nDevice IP:", self.ip, "\nListening...")
         except RuntimeError as err:
             print(f"Initialization error: {err}")
@@ -128,6 +282,32 @@ class GarageServer:
         except:
             self.device_location = "Hub"
 
+    # WiFi lost: close everything bound to the old link. Caches, history,
+    # calibration and the remotes registry are kept.
+    def network_down(self):
+        self.connections.closeAll()
+        self.push.closeAll()
+        if self.remote_cache.poller is not None:
+            self.remote_cache.poller.closeAll()
+        try:
+            self.server.stop()
+        except OSError:
+            pass
+        if self.telemetry is not None:
+            try:
+                self.telemetry.sock.close()
+            except OSError:
+                pass
+        self.telemetry = None
+        self.discovery = None
+
+    # WiFi back: new socket pool, server, sessions and NTP
+    def network_up(self):
+        self.ip = str(wifi.radio.ipv4_address)
+        self.setup_server()
+        self.setup_ntp()
+        print("\nDevice IP:", self.ip, "\nListening...")
+
     def fail_reboot(self):
         print("Rebooting in 5 seconds due to error...")
         time.sleep(5)
@@ -139,22 +319,24 @@ class GarageServer:
         if ssid is None or password is None:
             raise RuntimeError("WiFi credentials not found.")
 
+        # connect() returns once the link is up or raises, so there is no
+        # settling delay; failed attempts back off 1, 2, 4, 8 s
         MAX_WIFI_ATTEMPTS = 5
         attempt_count = 0
-        time.sleep(5)
+        if not wifi.radio.enabled:
+            wifi.radio.enabled = True
         while not wifi.radio.connected:
             if attempt_count >= MAX_WIFI_ATTEMPTS:
                 raise RuntimeError("Failed to connect to WiFi after multiple attempts.")
             print(f"\nConnecting to WiFi (attempt {attempt_count + 1}/{MAX_WIFI_ATTEMPTS})...")
             try:
                 wifi.radio.connect(ssid, password)
-                time.sleep(2)
             except ConnectionError as e:
                 print(f"WiFi Connection Error: {e}")
-                time.sleep(5)
+                time.sleep(1 << attempt_count)
             except Exception as e:
                 print(f"WiFi other connect error: {e}")
-                time.sleep(3)
+                time.sleep(1 << attempt_count)
             attempt_count += 1
 
         if wifi.radio.connected:
@@ -165,8 +347,25 @@ class GarageServer:
 
     def setup_server(self):
         pool = socketpool.SocketPool(wifi.radio)
+        self.pool = pool
         self.server = Server(pool, debug=False)
-        self.requests = adafruit_requests.Session(pool, ssl.create_default_context())
+        # HTTPS client for the notifications backend, only when one is set
+        if self.mail_url:
+            import ssl
+            import adafruit_requests
+            self.requests = adafruit_requests.Session(pool, ssl.create_default_context())
+            self.outbox.session = self.requests
+        self.remote_cache.poller = RemotePoller(pool, self.registry, self.remote_timeout)
+        try:
+            self.telemetry = TelemetryListener(pool, self.telemetry_port)
+            self.telemetry.handlers[MSG_READING] = self.onTelemetryReading
+            self.discovery = Discovery(self.telemetry, self.registry, self.discovery_interval)
+        except OSError as e:
+            print(f"UDP telemetry and discovery disabled: {e}")
+        # Kept across WiFi reconnects, with its hashes and cached files
+        if self.static is None:
+            self.static = StaticAssets("static", self.static_cache_budget,
+                                       self.static_cache_max_file, self.static_cache_min_free)
 
         # --- Routes ---
 
@@ -179,9 +378,28 @@ class GarageServer:
         @self.server.route("/api/run")
         def run_control(request):
             print("Run Control via HTTP request")
-            self.control.runControl()
-            # Use simplified Response for 200 OK
-            return Response(request, "OK")
+            op_id, started = self.control.runControl()
+            if not started:
+                print(f"Run Control: coalesced into operation {op_id}")
+            data_dict = {"operation_id": op_id, "coalesced": not started}
+            headers = {"Content-Type": "application/json"}
+            return Response(request, json.dumps(data_dict), headers=headers)
+
+        # Relay pulse / operation status
+        @self.server.route("/api/run/status")
+        def run_status(request):
+            data_dict = self.control.getStatus()
+            op_id = request.query_params.get("operation_id")
+            if op_id is not None:
+                try:
+                    op_id = int(op_id)
+                except ValueError:
+                    return Response(request, "Invalid operation_id", status=BAD_REQUEST_400)
+                if op_id < self.control.op_id:
+                    data_dict["state"] = "done"
+                data_dict["operation_id"] = op_id
+            headers = {"Content-Type": "application/json"}
+            return Response(request, json.dumps(data_dict), headers=headers)
 
         # Status Check Route (Placeholder)
         #@self.server.route("/status")
@@ -193,60 +411,103 @@ class GarageServer:
         def api_status(request):
             #device_id = request.args.get("device_id")
             device_id = request.query_params.get("device_id")
-            if device_id == "loc":
-                data = self.sensors.getEnvData(self.sensors.envSensor1, self.sensors.envSensor1_name, self.sensors.sensor1_correct_temp)
-                remote_sensor_ip = "local"
-                if self.sensors.sonar_location == "loc":
-                    state = self.sensors.checkStatusSonar()
-                else:
-                    state = "N/A"
-                location = self.device_location
-            else:
-                if device_id[:-1] == "remote":
-                    dev_type = device_id[:-1]
-                    dev_num = int(device_id[-1])
-                else:
-                    dev_type = "remote"
-                    dev_num = 0
-                data = self.getStatusRemoteSonar(dev_num)
-                remote_sensor_ip = self.remote_sensor_ip[dev_num]
-                state = data['state']
-                location = data['location']
-
-            UTC = self.getUTC()
-
-            data_dict = {
-                "state" : state,
-                "remote_sensor_ip" : remote_sensor_ip,
-                "libSensors_version": self.sensors.sensDev.version,
-                "ip": self.ip,
-                "ow_api_key": self.ow_api_key,
-                "station": self.station,
-                "zipcode": self.zipcode,
-                "country": self.country,
-                "version": version,
-                "UTC": UTC,
-                "sonar_location": self.sonar_location,
-            }
+            try:
+                self.getDeviceSlot(device_id)
+            except ValueError:
+                return Response(request, "Invalid device_id", status=BAD_REQUEST_400)
+            except IndexError:
+                return Response(request, "Unknown device_id", status=NOT_FOUND_404)
 
-            data_dict["Temp"] = data['temperature']
-            data_dict["RH"] = data['RH']
-            data_dict["HI"] = data['HI']
-            data_dict["IAQ"] = data['IAQ']
-            data_dict["TVOC"] = data['TVOC']
-            data_dict["eCO2"] = data['eCO2']
-            data_dict["Sens"] = data['type']
-            data_dict["location"] = location
+            data_dict = self.getConfigData()
+            data_dict.update(self.getDeviceData(device_id))
 
             json_content = json.dumps(data_dict)
-
-            print(f"\n{json_content}")
-
             headers = {"Content-Type": "application/json"}
 
             # Return the response using the compatible Response constructor
             return Response(request, json_content, headers=headers)
 
+        # Batched status: local reading plus every known remote
+        @self.server.route("/api/status/all")
+        def api_status_all(request):
+            data_dict = self.getConfigData()
+            devices = {"loc": self.getDeviceData("loc")}
+            for i in range(self.registry.count):
+                devices["remote"+str(i)] = self.getDeviceData("remote"+str(i))
+            data_dict["devices"] = devices
+
+            json_content = json.dumps(data_dict)
+            headers = {"Content-Type": "application/json"}
+            return Response(request, json_content, headers=headers)
+
+        # Push mode: remotes with hub_ip set POST their latest reading here
+        @self.server.route("/api/ingest", POST)
+        def api_ingest(request):
+            ip = request.client_address[0]
+            dev = self.registry.find(ip)
+            if dev is None:
+                print(f"Ingest from unknown device {ip}")
+                return Response(request, "Unknown device", status=FORBIDDEN_403)
+            try:
+                data = request.json()
+            except ValueError:
+                data = None
+            if not isinstance(data, dict) or any(key not in data for key in REMOTE_READING_KEYS):
+                return Response(request, "Invalid reading", status=BAD_REQUEST_400)
+            self.remote_cache.push(dev, data)
+            headers = {"Content-Type": "application/json"}
+            return Response(request, '{"ok": true}', headers=headers)
+
+        # WebSocket push channel: door transitions and new samples
+        @self.server.route("/ws")
+        def ws_route(request):
+            try:
+                ws = self.push.accept(request)
+            except ValueError as e:
+                return Response(request, str(e), status=BAD_REQUEST_400)
+            if ws is None:
+                return Response(request, "Too many WebSocket clients", status=SERVICE_UNAVAILABLE_503)
+            return ws
+
+        # History of local readings and door state, streamed as chunked JSON
+        @self.server.route("/api/history")
+        def api_history(request):
+            try:
+                since = int(request.query_params.get("since", 0))
+            except ValueError:
+                return Response(request, "Invalid since", status=BAD_REQUEST_400)
+            # "since" in UTC seconds (uptime before the first clock sync);
+            # source=log: persistent flash log
+            if request.query_params.get("source") == "log":
+                if self.history_log is None:
+                    return Response(request, "History log not enabled", status=NOT_FOUND_404)
+                return ChunkedResponse(request, lambda: self.history_log.stream(since),
+                                       content_type="application/json")
+            return ChunkedResponse(request, lambda: self.history.stream(since),
+                                   content_type="application/json")
+
+        # Diagnostics: free memory and static cache efficiency
+        @self.server.route("/api/diag")
+        def api_diag(request):
+            data_dict = {"mem_free": gc.mem_free(),
+                         "static_cache": self.static.stats(),
+                         "notifications": self.outbox.stats(),
+                         "telemetry": self.telemetry.stats() if self.telemetry else None,
+                         "remotes": self.registry.stats(),
+                         "discovery": self.discovery.stats() if self.discovery else None,
+                         "loop": self.loop.stats(),
+                         "http": self.connections.stats(),
+                         "clock": self.clock.stats(),
+                         "wifi": self.link.stats()}
+            headers = {"Content-Type": "application/json"}
+            return Response(request, json.dumps(data_dict), headers=headers)
+
+        # Boot phase timings and free memory after each phase
+        @self.server.route("/api/boot")
+        def api_boot(request):
+            headers = {"Content-Type": "application/json"}
+            return Response(request, json.dumps(self.boot.stats()), headers=headers)
+
         @self.server.route("/scripts.js")
         def icon_route(request):
             return self._serve_static_file(request, 'static/scripts.js')
@@ -259,6 +520,11 @@ class GarageServer:
         def icon_route(request):
             return self._serve_static_file(request, 'static/simple.js')
 
+        # Service worker for the offline-first dashboard
+        @self.server.route("/sw.js")
+        def sw_route(request):
+            return self._serve_static_file(request, 'static/sw.js', content_type="text/javascript")
+
         @self.server.route("/manifest.json")
         def icon_route(request):
             return self._serve_static_file(request, 'static/manifest.json')
@@ -276,84 +542,1953 @@ class GarageServer:
         def icon_route(request):
             return self._serve_static_file(request, 'static/icon.png', content_type="image/png")
 
-        # Start the server
+        # Start the server; connections are then served by self.connections
         self.server.start(host=self.ip, port=80)
+        if self.connections is None:
+            self.connections = HTTPConnections(self.server, self.http_slots, self.http_timeout)
+        else:
+            self.connections.server = self.server
+
+    # Fields shared by every device in a status response
+    def getConfigData(self):
+        return {
+            "libSensors_version": self.sensors.sensDev.version,
+            "ip": self.ip,
+            "ow_api_key": self.ow_api_key,
+            "station": self.station,
+            "zipcode": self.zipcode,
+            "country": self.country,
+            "version": version,
+            "UTC": self.clock.utc_ns(),
+            "sonar_location": self.sonar_location,
+        }
+
+    # Registry slot of "remoteN" (None for "loc"). Raises ValueError for a
+    # malformed id and IndexError for a slot with no remote in it.
+    def getDeviceSlot(self, device_id):
+        if device_id == "loc":
+            return None
+        if device_id is None or device_id[:6] != "remote":
+            raise ValueError(f"Invalid device_id: {device_id}")
+        dev_num = int(device_id[6:])
+        if dev_num < 0 or dev_num >= self.registry.count:
+            raise IndexError(f"Unknown device_id: {device_id}")
+        return dev_num
+
+    # Per-device reading, with "status" ("ok", "stale", "unavailable", "down"),
+    # "error" and, for remotes, "health" (round-trip time, success rate, breaker)
+    def getDeviceData(self, device_id):
+        if device_id == "loc":
+            data = self.sensors.envSampler.latest()
+            remote_sensor_ip = "local"
+            if self.sensors.sonar_location == "loc":
+                state = self.sensors.doorState()
+            else:
+                state = "N/A"
+            location = self.device_location
+            age = self.sensors.envSampler.age()
+            status = "ok"
+            error = None
+            health = None
+        else:
+            dev_num = self.getDeviceSlot(device_id)
+            data = self.remote_cache.get(dev_num)
+            remote_sensor_ip = self.registry.ips[dev_num] or ""
+            state = data['state']
+            location = data['location'] or self.registry.locations[dev_num]
+            age = self.remote_cache.age(dev_num)
+            status = self.remote_cache.status(dev_num)
+            error = self.remote_cache.errors[dev_num]
+            health = self.remote_cache.health.stats(dev_num)
+
+        return {
+            "state" : state,
+            "remote_sensor_ip" : remote_sensor_ip,
+            "Temp": data['temperature'],
+            "RH": data['RH'],
+            "HI": data['HI'],
+            "IAQ": data['IAQ'],
+            "TVOC": data['TVOC'],
+            "eCO2": data['eCO2'],
+            "Sens": data['type'],
+            "location": location,
+            "age": age,
+            "status": status,
+            "error": error,
+            "health": health,
+        }
+
+    def onTelemetryReading(self, device_id, ip, payload):
+        dev = self.registry.lookup(device_id, ip)
+        if dev is None:
+            print(f"Telemetry from {ip} ignored: {self.registry.max_remotes} remotes already known")
+            return
+        previous = self.remote_cache.data[dev]
+        self.remote_cache.push(dev, decodeReading(payload, previous))
+        if previous is None and not self.registry.locations[dev]:
+            # Location and sensor details only come with the HTTP status
+            self.remote_cache.start(dev)
+
+    def onRemoteUpdate(self, dev):
+        self.push.publish("remote"+str(dev), self.getDeviceData("remote"+str(dev)))
+
+    # Door state without triggering any sensor read or remote fetch
+    def getDoorState(self):
+        if self.sonar_location == "loc":
+            return self.sensors.doorState()
+        try:
+            dev = self.getDeviceSlot(self.sonar_location)
+        except (ValueError, IndexError):
+            return "N/A"
+        data = self.remote_cache.data[dev]
+        if data is not None:
+            return data['state']
+        return "N/A"
 
     def _serve_static_file(self, request, filepath, content_type=None):
-        """Streams a file from flash memory using FileResponse to prevent memory fragmentation."""
+        """Serves small files from the RAM cache, streams the others from flash memory
+        using FileResponse to prevent memory fragmentation. The prebuilt .gz variant
+        (see utilities/build_static) is sent to clients accepting gzip.
+        Answers with 304 and no body when the client already has the current version."""
+        if self.static.etag(filepath) is None:
+            print(f"Error locating or accessing file {filepath}")
+            return Response(request, "File Not Found", status=NOT_FOUND_404)
+
+        headers = {"Cache-Control": self.static.cacheControl(filepath)}
+        content_type = content_type or MIMETypes.get_for_filename(filepath)
+        gz_filepath = self.static.gzipped.get(filepath)
+        if gz_filepath is not None:
+            headers["Vary"] = "Accept-Encoding"
+            if "gzip" in (request.headers.get("Accept-Encoding") or ""):
+                headers["Content-Encoding"] = "gzip"
+                filepath = gz_filepath
+
+        etag = self.static.etag(filepath)
+        headers["ETag"] = etag
+        if self.static.matches(request.headers.get("If-None-Match"), etag):
+            return Response(request, "", status=NOT_MODIFIED_304, headers=headers)
+
+        body = self.static.cached(filepath)
+        if body is not None:
+            return Response(request, body, headers=headers, content_type=content_type)
+
         try:
-            # We use os.stat to verify the file exists before returning the response. 
-            # This allows us to catch a missing file and cleanly return a 404.
-            os.stat(filepath)
-            
             # FileResponse automatically handles chunked reading and streaming
-            if content_type:
-                return FileResponse(request, filepath, content_type=content_type)
-            
-            return FileResponse(request, filepath)
+            return FileResponse(request, filepath, self.static.root, headers=headers, content_type=content_type)
 
         except OSError as e:
             # Handle File Not Found or other OS errors
             print(f"Error locating or accessing file {filepath}: {e}")
-            return Response(request, "File Not Found", status=404)
+            return Response(request, "File Not Found", status=NOT_FOUND_404)
 
     def serve_forever(self):
+        # First NTP sync, off the path to a listening server
+        self.setup_ntp()
+        self.sync_clock()
+        self.boot.mark("ntp")
+
         while True:
-            if not wifi.radio.connected:
-                print("WiFi connection lost. Rebooting...")
-                self.reboot()
+            self.control.service()
+
+            # While WiFi is down only the network is skipped: the relay,
+            # sensors and history keep running
+            online = self.link.service(hold=self.control.pulse_end is not None)
 
+            idle = False
             try:
-                self.server.poll()
+                if online:
+                    if self.connections.service():
+                        self.loop.busy()
+                    else:
+                        idle = self.connections.open() == 0
             except (BrokenPipeError, OSError) as e:
-                if isinstance(e, OSError) and e.args[0] not in (32, 104):
+                if isinstance(e, OSError) and socketErrno(e) not in (32, 104):
                     print(f"Unexpected OSError in server poll: {e}")
                 elif isinstance(e, BrokenPipeError):
                    pass
             except Exception as e:
                 print(f"Unexpected critical error in server poll: {e}")
 
-            time.sleep(0.01)
+            try:
+                if self.telemetry is not None and self.telemetry.service():
+                    self.loop.busy()
+                if self.discovery is not None:
+                    self.discovery.service()
+                if online:
+                    self.remote_cache.service()
+            except Exception as e:
+                print(f"Error refreshing remote sensors cache: {e}")
 
-    def getStatusRemoteSonar(self, dev):
-        try:
-            r = self.requests.get("http://"+self.remote_sensor_ip[dev]+"/api/status", timeout=3.0)
-            data = r.json()
-            r.close()
-            return data
-        except Exception as e:
-            if e.errno == 119:  # EINPROGRESS
-                print("Connection in progress... waiting.")
-            else:
-                print(f"Sonar not available: {e}")
-            return {'state': 'N/A',
-                    'temperature': '--',
-                    'pressure': '--',
-                    'RH': '--',
-                    'HI': '--',
-                    'IAQ': '--',
-                    'TVOC': '--',
-                    'eCO2': '--',
-                    'type': '--',
-                    'location': ''}
+            try:
+                if online:
+                    self.sync_clock(hold=self.control.pulse_end is not None)
+            except Exception as e:
+                print(f"Error syncing clock: {e}")
+
+            try:
+                if self.sensors.sonarSampler:
+                    self.sensors.sonarSampler.service()
+            except Exception as e:
+                print(f"Error sampling sonar: {e}")
+
+            # Door state read once per pass, shared by history, push and notifications
+            door = self.getDoorState()
+
+            try:
+                if self.sensors.envSampler.service():
+                    self.push.publish("loc", self.getDeviceData("loc"))
+                    t = self.sensors.envSampler.last_stamp
+                    i = self.history.add(t, self.sensors.envSampler.last, door)
+                    if i is not None and self.history_log is not None and self.clock.synced():
+                        self.history_log.add(t, self.history.record(i))
+            except Exception as e:
+                print(f"Error sampling environmental sensor: {e}")
+
+            try:
+                self.push.publishDoor(door)
+                self.push.service()
+            except Exception as e:
+                print(f"Error in WebSocket push channel: {e}")
+
+            try:
+                self.door_watch.service(door)
+                if online:
+                    self.outbox.service(idle, hold=self.control.pulse_end is not None)
+            except Exception as e:
+                print(f"Error sending notifications: {e}")
+
+            self.loop.wake(self.control.pulse_end)
+            self.loop.wake(self.sensors.envSampler.next_sample)
+            if self.sensors.sonarSampler:
+                self.loop.wake(self.sensors.sonarSampler.next_sample)
+            if self.registry.count and online:
+                self.loop.wake(self.remote_cache.next_refresh)
+            # Only deadlines whose service() would act on them: NTP sync and
+            # WiFi reconnect are held during a relay pulse, and the pulse end
+            # wakes the loop instead
+            if self.control.pulse_end is None:
+                if online and self.clock.ntp is not None:
+                    self.loop.wake(self.clock.next_sync)
+                if not online:
+                    self.loop.wake(self.link.next_attempt)
+            self.loop.sleep()
 
     def setup_ntp(self):
         try:
-            self.ntp = adafruit_ntp.NTP(socketpool.SocketPool(wifi.radio), tz_offset=0)
+            self.clock.setPool(self.pool)
         except Exception as e:
             print(f"Failed to setup NTP: {e}")
 
-    def getUTC(self):
-        try:
-            return self.ntp.utc_ns
-        except Exception as e:
-            print(f"Error converting NTP time: {e}")
-            return 0
+    # NTP sync when due; the first one moves the history kept so far to UTC
+    def sync_clock(self, hold=False):
+        first = not self.clock.synced()
+        if self.clock.service(hold) and first:
+            self.history.rebase(self.clock.offset // 1_000_000_000)
 
     def reboot(self):
+        if self.history_log is not None:
+            try:
+                self.history_log.flush()
+            except OSError as e:
+                print(f"Failed to flush history log: {e}")
         time.sleep(2)
         microcontroller.reset()
 
+############################
+# Boot timing
+############################
+# Duration of each boot phase and free memory at its end. The first phase
+# starts at boot_start, when code.py begins; started_at is the time since
+# power-up spent before that (supervisor, boot.py).
+class BootTimer:
+    def __init__(self, start):
+        self.start = start
+        self.last = start
+        self.phases = []
+
+    def mark(self, name):
+        now = time.monotonic()
+        self.phases.append((name, now - self.last, gc.mem_free()))
+        self.last = now
+
+    def stats(self):
+        return {"started_at": round(self.start, 3),
+                "total_s": round(self.last - self.start, 3),
+                "phases": [{"phase": name, "s": round(elapsed, 3), "mem_free": mem}
+                           for name, elapsed, mem in self.phases]}
+
+############################
+# Clock
+############################
+# UTC derived locally from time.monotonic_ns() and the offset measured at
+# the last NTP sync, so reading it never touches the network. Syncs at boot
+# and every resync_interval seconds; a failed sync is retried after
+# retry_interval, doubling up to resync_interval. The offset change between
+# two syncs gives the drift of the board clock.
+class Clock:
+    def __init__(self, resync_interval, retry_interval=30.0, timeout=2.0):
+        self.resync_interval = resync_interval
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.ntp = None
+
+        self.offset = None      # UTC ns minus time.monotonic_ns()
+        self.synced_ns = None   # time.monotonic_ns() at the last sync
+        self.next_sync = time.monotonic()
+        self.backoff = retry_interval
+
+        self.syncs = 0
+        self.failures = 0
+        self.step_ms = None     # offset change at the last resync
+        self.drift_ppm = None
+
+    # Socket pool for NTP (boot, WiFi reconnect); the offset is kept
+    def setPool(self, pool):
+        import adafruit_ntp
+        self.ntp = adafruit_ntp.NTP(pool, tz_offset=0, socket_timeout=self.timeout)
+
+    def synced(self):
+        return self.offset is not None
+
+    # UTC in ns, 0 before the first sync
+    def utc_ns(self):
+        if self.offset is None:
+            return 0
+        return time.monotonic_ns() + self.offset
+
+    # Timestamp for stored samples: UTC seconds once synced, uptime
+    # seconds before (see HistoryStore.rebase)
+    def time(self):
+        if self.offset is None:
+            return time.monotonic_ns() // 1_000_000_000
+        return (time.monotonic_ns() + self.offset) // 1_000_000_000
+
+    # One NTP exchange; blocks for at most timeout per server
+    def sync(self):
+        try:
+            # Query the server even while adafruit_ntp's own cache is valid
+            self.ntp.next_sync = 0
+            utc = self.ntp.utc_ns
+            now_ns = time.monotonic_ns()
+        except Exception as e:
+            self.failures += 1
+            print(f"NTP sync failed, retrying in {self.backoff:.0f} s: {e}")
+            self.next_sync = time.monotonic() + self.backoff
+            self.backoff = min(self.backoff * 2, self.resync_interval)
+            return False
+
+        offset = utc - now_ns
+        if self.offset is not None:
+            self.step_ms = (offset - self.offset) / 1_000_000
+            self.drift_ppm = (offset - self.offset) * 1_000_000 / (now_ns - self.synced_ns)
+        self.offset = offset
+        self.synced_ns = now_ns
+        self.syncs += 1
+        self.backoff = self.retry_interval
+        self.next_sync = time.monotonic() + self.resync_interval
+        return True
+
+    # Called from the main loop while online; True when a sync succeeded.
+    # Put off while hold is set (e.g. the relay is pulsing: sync() blocks).
+    def service(self, hold=False):
+        if self.ntp is None or hold or time.monotonic() < self.next_sync:
+            return False
+        return self.sync()
+
+    def stats(self):
+        return {"synced": self.synced(),
+                "utc": self.time() if self.synced() else None,
+                "last_sync_age_s": (time.monotonic_ns() - self.synced_ns) // 1_000_000_000
+                                   if self.synced_ns is not None else None,
+                "next_sync_s": round(max(0, self.next_sync - time.monotonic()), 1),
+                "syncs": self.syncs,
+                "failures": self.failures,
+                "last_step_ms": round(self.step_ms, 1) if self.step_ms is not None else None,
+                "drift_ppm": round(self.drift_ppm, 2) if self.drift_ppm is not None else None}
+
+############################
+# Main loop scheduler
+############################
+# Paces serve_forever instead of a fixed sleep. After a pass that served a
+# request the loop runs again right away; idle passes sleep min_sleep,
+# doubling up to max_sleep, but never past the earliest timer deadline
+# (relay pulse end, next sample, remote refresh) registered with wake().
+class LoopScheduler:
+    def __init__(self, min_sleep=0.001, max_sleep=0.05):
+        self.min_sleep = min_sleep
+        self.max_sleep = max_sleep
+        self.idle_sleep = 0.0
+        self.deadline = None
+        self.active = False
+
+        self.passes = 0
+        self.busy_passes = 0
+        self.slept = 0.0
+        self.started = time.monotonic()
+
+    # Something was served this pass: poll again without sleeping
+    def busy(self):
+        self.active = True
+
+    # Timer deadline (time.monotonic()) for this pass; None for no timer
+    def wake(self, deadline):
+        if deadline is not None and (self.deadline is None or deadline < self.deadline):
+            self.deadline = deadline
+
+    def sleep(self):
+        self.passes += 1
+        if self.active:
+            self.active = False
+            self.busy_passes += 1
+            self.idle_sleep = 0.0
+        delay = self.idle_sleep
+        if self.deadline is not None:
+            delay = min(delay, self.deadline - time.monotonic())
+            self.deadline = None
+        if delay > 0:
+            time.sleep(delay)
+            self.slept += delay
+        self.idle_sleep = min(max(self.idle_sleep * 2, self.min_sleep), self.max_sleep)
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        return {"passes": self.passes,
+                "busy_passes": self.busy_passes,
+                "idle_sleep": self.idle_sleep,
+                "sleep_ratio": round(self.slept / elapsed, 3) if elapsed else 0}
+
+############################
+# WiFi reconnect
+############################
+# Brings the link back in place when WiFi drops, instead of rebooting:
+# reconnect attempts back off from min_backoff to max_backoff seconds and,
+# once connected, on_up() rebuilds the sockets while all in-memory state
+# stays. Rebooting is the last resort, after reboot_after seconds down.
+class WifiReconnect:
+    def __init__(self, ssid, password, reboot_after, min_backoff=1.0, max_backoff=30.0):
+        self.ssid = ssid
+        self.password = password
+        self.reboot_after = reboot_after
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.backoff = min_backoff
+        self.down_since = None
+        self.next_attempt = None
+
+        # Callbacks set by the owner
+        self.on_down = None     # link lost: drop the sockets
+        self.on_up = None       # link back: rebuild the sockets
+        self.on_give_up = None  # down for reboot_after seconds
+
+        self.outages = 0
+        self.attempts = 0
+        self.last_outage = None
+
+    # True while the link is up. While it is down, makes one connection
+    # attempt when the backoff expires, unless hold is set (e.g. the relay
+    # is pulsing: connect() blocks).
+    def service(self, hold=False):
+        now = time.monotonic()
+        if self.down_since is None:
+            if wifi.radio.connected:
+                return True
+            print("WiFi connection lost. Reconnecting...")
+            self.down_since = now
+            self.next_attempt = now
+            self.backoff = self.min_backoff
+            self.outages += 1
+            self.on_down()
+
+        if now - self.down_since > self.reboot_after:
+            print(f"WiFi down for more than {self.reboot_after:.0f} s. Rebooting...")
+            self.on_give_up()
+        if hold or now < self.next_attempt:
+            return False
+
+        self.attempts += 1
+        try:
+            if not wifi.radio.connected:
+                wifi.radio.connect(self.ssid, self.password)
+            self.on_up()
+        except Exception as e:
+            print(f"WiFi reconnect failed, retrying in {self.backoff:.0f} s: {e}")
+            # Drop whatever on_up() set up before failing
+            self.on_down()
+            self.next_attempt = time.monotonic() + self.backoff
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            return False
+
+        self.last_outage = time.monotonic() - self.down_since
+        self.down_since = None
+        self.next_attempt = None
+        print(f"WiFi reconnected after {self.last_outage:.1f} s")
+        return True
+
+    def stats(self):
+        return {"connected": self.down_since is None,
+                "down_s": round(time.monotonic() - self.down_since, 1) if self.down_since is not None else 0,
+                "outages": self.outages,
+                "attempts": self.attempts,
+                "last_outage_s": round(self.last_outage, 1) if self.last_outage is not None else None}
+
+############################
+# HTTP connections
+############################
+# Serves several clients at once instead of one request at a time, end to
+# end, in Server.poll(). Each connection takes one of a fixed number of slots
+# with preallocated buffers; sockets are non-blocking, so a client that
+# sends its request or reads the response slowly only holds its own slot,
+# and gives it up when its deadline passes. A request is read completely
+# into the slot before its route runs. The response headers go to the slot's
+# buffer, and the body stays where it is (bytes in RAM, an open file or a
+# chunk generator) and is sent from there whenever the socket takes more,
+# over the next passes: the loop never waits for a slow reader. Routing and
+# responses are adafruit_httpserver's, through internals of the 4.x library
+# (Server._sock, _find_handler, _handle_request, Response._send_headers).
+CONTENT_TOO_LARGE = b"HTTP/1.1 413 Content Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+# Socket stand-in given to responses in place of the client socket
+class SlotWriter:
+    def __init__(self, connections, slot):
+        self.connections = connections
+        self.slot = slot
+
+    def send(self, data):
+        return self.connections.write(self.slot, data)
+
+    def close(self):
+        self.connections.closing[self.slot] = True
+
+class HTTPConnections:
+    def __init__(self, server, slots, timeout, rx_size=1536, tx_size=2048):
+        self.server = server
+        self.timeout = timeout
+
+        self.socks = [None] * slots
+        self.addrs = [None] * slots
+        self.deadlines = [0.0] * slots
+        self.rx = [bytearray(rx_size) for _ in range(slots)]
+        self.rx_len = [0] * slots
+        self.needed = [0] * slots       # request length, once the headers are in
+        self.tx = [bytearray(tx_size) for _ in range(slots)]
+        self.tx_start = [0] * slots
+        self.tx_end = [0] * slots
+        self.writing = [False] * slots
+        self.closing = [False] * slots
+        self.writers = [SlotWriter(self, slot) for slot in range(slots)]
+        # Response body still to send: the current piece, then the open
+        # file or chunk generator it comes from
+        self.out = [None] * slots
+        self.files = [None] * slots
+        self.chunks = [None] * slots
+
+        self.accepted = 0
+        self.served = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.peak = 0
+
+    def open(self):
+        return len(self.socks) - self.socks.count(None)
+
+    # Frees a slot, closing its socket unless it was handed over
+    def release(self, slot, close=True):
+        if close:
+            try:
+                self.socks[slot].close()
+            except OSError:
+                pass
+        self.socks[slot] = None
+        self.rx_len[slot] = 0
+        self.needed[slot] = 0
+        self.tx_start[slot] = 0
+        self.tx_end[slot] = 0
+        self.writing[slot] = False
+        self.closing[slot] = False
+        if self.files[slot] is not None:
+            self.files[slot].close()
+        self.out[slot] = None
+        self.files[slot] = None
+        self.chunks[slot] = None
+
+    def closeAll(self):
+        for slot in range(len(self.socks)):
+            if self.socks[slot] is not None:
+                self.release(slot)
+
+    # New connections wait in the listen backlog while every slot is taken
+    def accept(self):
+        accepted = False
+        while None in self.socks:
+            try:
+                sock, addr = self.server._sock.accept()
+            except OSError as e:
+                if socketErrno(e) in WAIT_ERRNOS:
+                    break
+                raise
+            sock.setblocking(False)
+            slot = self.socks.index(None)
+            self.socks[slot] = sock
+            self.addrs[slot] = addr
+            self.deadlines[slot] = time.monotonic() + self.timeout
+            self.accepted += 1
+            self.peak = max(self.peak, self.open())
+            accepted = True
+        return accepted
+
+    # Sends what the socket takes right now; 0 when its buffer is full
+    def sendSome(self, slot, data):
+        try:
+            return self.socks[slot].send(data)
+        except OSError as e:
+            if socketErrno(e) in WAIT_ERRNOS:
+                return 0
+            raise
+
+    # Headers and short responses: straight to the socket when nothing is
+    # queued, the rest to the slot buffer. Never waits: data that fits in
+    # neither fails the response (bodies go through start() instead).
+    def write(self, slot, data):
+        sent = 0
+        if self.tx_start[slot] == self.tx_end[slot]:
+            sent = self.sendSome(slot, data)
+            if sent == len(data):
+                return sent
+        view = memoryview(data)[sent:]
+        if self.queue(slot, view) < len(view):
+            raise OSError(errno.ENOBUFS)
+        return len(data)
+
+    def queue(self, slot, data):
+        tx = self.tx[slot]
+        start = self.tx_start[slot]
+        end = self.tx_end[slot]
+        if end + len(data) > len(tx) and start > 0:
+            tx[:end - start] = tx[start:end]
+            end -= start
+            start = 0
+        n = min(len(data), len(tx) - end)
+        tx[end:end + n] = data[:n]
+        self.tx_start[slot] = start
+        self.tx_end[slot] = end + n
+        return n
+
+    def flush(self, slot):
+        start = self.tx_start[slot]
+        end = self.tx_end[slot]
+        if start == end:
+            return False
+        n = self.sendSome(slot, memoryview(self.tx[slot])[start:end])
+        if start + n == end:
+            self.tx_start[slot] = self.tx_end[slot] = 0
+        else:
+            self.tx_start[slot] = start + n
+        return n > 0
+
+    # Next piece of the body from the slot's file or chunk generator, None
+    # at the end. The slot buffer is empty by then and holds file reads.
+    def refill(self, slot):
+        f = self.files[slot]
+        if f is not None:
+            n = f.readinto(self.tx[slot])
+            if n:
+                return memoryview(self.tx[slot])[:n]
+            f.close()
+            self.files[slot] = None
+        body = self.chunks[slot]
+        if body is not None:
+            for chunk in body:
+                if chunk:
+                    chunk = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+                    return memoryview(b"%x\r\n" % len(chunk) + chunk + b"\r\n")
+            # Empty chunk: end of the response
+            self.chunks[slot] = None
+            return memoryview(b"0\r\n\r\n")
+        return None
+
+    # Sends as much of the response as the socket takes right now: the
+    # slot buffer first, then the body. True if anything was sent.
+    def pump(self, slot):
+        progress = self.flush(slot)
+        while self.tx_start[slot] == self.tx_end[slot]:
+            out = self.out[slot]
+            if out is None or len(out) == 0:
+                out = self.refill(slot)
+                self.out[slot] = out
+                if out is None:
+                    break
+            n = self.sendSome(slot, out)
+            self.out[slot] = out[n:]
+            if n == 0:
+                break
+            progress = True
+        return progress
+
+    # Whole response handed to the socket
+    def done(self, slot):
+        return self.tx_start[slot] == self.tx_end[slot] and not self.out[slot] \
+            and self.files[slot] is None and self.chunks[slot] is None
+
+    # Headers to the slot buffer now; the body is kept on the slot for pump().
+    # Mirrors the _send() of each response class without its blocking loop.
+    def start(self, slot, response):
+        if isinstance(response, FileResponse):
+            response._send_headers(response._file_length, response._content_type)
+            if not response._head_only:
+                self.files[slot] = open(response._full_file_path, "rb")
+        elif isinstance(response, ChunkedResponse):
+            response._send_headers()
+            self.chunks[slot] = response._body()
+        elif type(response) is Response:
+            body = response._body
+            body = body.encode("utf-8") if isinstance(body, str) else body
+            response._send_headers(len(body), response._content_type)
+            self.out[slot] = memoryview(body)
+        else:
+            # Other response types (redirects...) are short: sent as they are
+            response._send()
+            return
+        self.closing[slot] = True
+
+    # Content-Length of a request from its header bytes
+    def contentLength(self, header):
+        i = header.lower().find(b"\r\ncontent-length:")
+        if i < 0:
+            return 0
+        end = header.find(b"\r\n", i + 2)
+        return int(header[i + 17:end if end >= 0 else len(header)])
+
+    def read(self, slot):
+        rx = self.rx[slot]
+        try:
+            n = self.socks[slot].recv_into(memoryview(rx)[self.rx_len[slot]:])
+        except OSError as e:
+            if socketErrno(e) in WAIT_ERRNOS:
+                return False
+            raise
+        if n == 0:
+            # Closed by the client, possibly before sending anything
+            self.release(slot)
+            return True
+        self.rx_len[slot] += n
+        if not self.needed[slot]:
+            received = bytes(memoryview(rx)[:self.rx_len[slot]])
+            end = received.find(b"\r\n\r\n")
+            if end >= 0:
+                self.needed[slot] = end + 4 + self.contentLength(received[:end])
+        if self.needed[slot] and self.rx_len[slot] >= self.needed[slot]:
+            self.dispatch(slot)
+        elif self.rx_len[slot] == len(rx) or self.needed[slot] > len(rx):
+            self.rejected += 1
+            self.respond(slot)
+            self.write(slot, CONTENT_TOO_LARGE)
+            self.closing[slot] = True
+        return True
+
+    def respond(self, slot):
+        self.writing[slot] = True
+        self.deadlines[slot] = time.monotonic() + self.timeout
+
+    def dispatch(self, slot):
+        sock = self.socks[slot]
+        raw = bytes(memoryview(self.rx[slot])[:self.needed[slot]])
+        request = Request(self.server, sock, self.addrs[slot], raw)
+        handler = self.server._find_handler(request.method, request.path)
+        response = self.server._handle_request(request, handler)
+        if response is None:
+            self.release(slot)
+            return
+        self.server._set_default_server_headers(response)
+        self.served += 1
+        if isinstance(response, Websocket):
+            # The handshake is short; the WebSocket then keeps the socket
+            response._send()
+            self.release(slot, close=False)
+            return
+        self.respond(slot)
+        request.connection = self.writers[slot]
+        self.start(slot, response)
+        self.pump(slot)
+
+    # Called from the main loop; True if any connection made progress
+    def service(self):
+        progress = self.accept()
+        for slot in range(len(self.socks)):
+            if self.socks[slot] is None:
+                continue
+            try:
+                if self.writing[slot]:
+                    progress = self.pump(slot) or progress
+                    if self.closing[slot] and self.done(slot):
+                        self.release(slot)
+                        continue
+                else:
+                    progress = self.read(slot) or progress
+            except Exception as e:
+                if socketErrno(e) not in (32, 104):
+                    print(f"HTTP connection from {self.addrs[slot][0]} dropped: {e}")
+                if self.socks[slot] is not None:
+                    self.release(slot)
+                continue
+            if self.socks[slot] is not None and time.monotonic() > self.deadlines[slot]:
+                self.timeouts += 1
+                self.release(slot)
+        return progress
+
+    def stats(self):
+        return {"slots": len(self.socks),
+                "open": self.open(),
+                "peak": self.peak,
+                "accepted": self.accepted,
+                "served": self.served,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected}
+
+############################
+# Static assets
+############################
+NOT_MODIFIED_304 = Status(304, "Not Modified")
+
+# Cache-Control by file extension. Pages and scripts are revalidated on every
+# load (cheap with ETags), icons and the manifest rarely change.
+STATIC_CACHE_CONTROL = {
+    "html": "no-cache",
+    "js": "no-cache",
+    "json": "public, max-age=86400",
+    "png": "public, max-age=604800",
+    "ico": "public, max-age=604800",
+}
+STATIC_CACHE_DEFAULT = "no-cache"
+
+# Content hash ETags for the files in the static folder, computed once at boot,
+# the gzipped variants matching their source, and a byte-budgeted LRU cache
+# keeping the small ones in RAM
+class StaticAssets:
+    def __init__(self, folder, budget, max_file, min_free, chunk_size=512):
+        self.folder = folder
+        self.root = os.getcwd()
+        self.etags = {}
+        self.sizes = {}
+        self.gzipped = {}   # filepath -> filepath.gz
+        self.budget = budget
+        self.max_file = max_file
+        self.min_free = min_free
+        self.cache = {}     # filepath -> [bytearray, last use]
+        self.used = 0
+        self.tick = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        buf = bytearray(chunk_size)
+        try:
+            names = os.listdir(folder)
+        except OSError as e:
+            print(f"Static folder {folder} not available: {e}")
+            names = []
+        for name in names:
+            filepath = folder + "/" + name
+            try:
+                self.etags[filepath] = self.hashFile(filepath, buf)
+            except OSError as e:
+                print(f"Could not hash {filepath}: {e}")
+        for filepath in [f for f in self.etags if f.endswith(".gz")]:
+            source = self.etags.get(filepath[:-3])
+            if source is not None and self.gzipSource(filepath) == source[1:9]:
+                self.gzipped[filepath[:-3]] = filepath
+            else:
+                print(f"Ignoring {filepath}: out of date, run build_static.py")
+                del self.etags[filepath]
+        print(f"Static assets: {len(self.etags)} files hashed, {len(self.gzipped)} gzipped")
+
+    def hashFile(self, filepath, buf):
+        crc = 0
+        size = 0
+        mv = memoryview(buf)
+        with open(filepath, "rb") as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                crc = binascii.crc32(mv[:n], crc)
+                size += n
+        self.sizes[filepath] = size
+        return '"%08x-%x"' % (crc & 0xFFFFFFFF, size)
+
+    # CRC of the source a .gz was built from, stored by build_static.py
+    # as "<name>@<crc>" in the gzip file name field
+    def gzipSource(self, filepath):
+        try:
+            with open(filepath, "rb") as f:
+                header = f.read(80)
+        except OSError:
+            return None
+        if header[:2] != b"\x1f\x8b" or not header[3] & 0x08:
+            return None
+        name = header[10:header.find(b"\x00", 10)]
+        return name[name.rfind(b"@") + 1:].decode()
+
+    def etag(self, filepath):
+        return self.etags.get(filepath)
+
+    def cacheControl(self, filepath):
+        return STATIC_CACHE_CONTROL.get(filepath.rsplit(".", 1)[-1], STATIC_CACHE_DEFAULT)
+
+    # File contents from RAM, loading them on a miss. None means stream it
+    # instead: too large, unknown, or not enough free memory to cache it.
+    def cached(self, filepath):
+        self.tick += 1
+        entry = self.cache.get(filepath)
+        if entry is not None:
+            entry[1] = self.tick
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        size = self.sizes.get(filepath)
+        if size is None or size > self.max_file or size > self.budget:
+            return None
+        while self.used + size > self.budget:
+            self.evict()
+        if gc.mem_free() - size < self.min_free:
+            self.bypassed += 1
+            return None
+        try:
+            buf = bytearray(size)
+            with open(filepath, "rb") as f:
+                if f.readinto(buf) != size:
+                    return None
+        except (OSError, MemoryError) as e:
+            print(f"Static cache: could not load {filepath}: {e}")
+            return None
+        self.cache[filepath] = [buf, self.tick]
+        self.used += size
+        return buf
+
+    # Drop the least recently used entry
+    def evict(self):
+        oldest = None
+        for filepath, entry in self.cache.items():
+            if oldest is None or entry[1] < self.cache[oldest][1]:
+                oldest = filepath
+        self.used -= len(self.cache.pop(oldest)[0])
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.cache),
+            "bytes": self.used,
+            "budget": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+    # If-None-Match may list several tags, weak (W/) ones or "*"
+    def matches(self, header, etag):
+        if not header:
+            return False
+        for tag in header.split(","):
+            tag = tag.strip()
+            if tag == "*" or tag == etag or (tag[:2] == "W/" and tag[2:] == etag):
+                return True
+        return False
+
+############################
+# Remote sensors registry
+############################
+# Remote sensors known to the hub, one slot per device ("remote0", ...).
+# Slots are seeded from remote_sensor_ip, by IP address or by device id
+# (8 hex digits, as in /api/diag), and filled by discovery in the order
+# devices are first heard. A device keeps its slot when DHCP moves it.
+class RemoteRegistry:
+    def __init__(self, seeds, max_remotes, ttl):
+        self.max_remotes = max(max_remotes, len(seeds))
+        self.count = len(seeds)
+
+        num = self.max_remotes
+        self.ips = [None] * num
+        self.ids = [None] * num
+        self.ports = [80] * num
+        self.ttls = [ttl] * num
+        self.locations = [""] * num
+        self.seen = [None] * num
+
+        now = time.monotonic()
+        for slot in range(self.count):
+            if '.' in seeds[slot]:
+                self.ips[slot] = seeds[slot]
+                # Presumed alive until its first polls go unanswered
+                self.seen[slot] = now
+            else:
+                self.ids[slot] = int(seeds[slot], 16)
+
+    def find(self, ip):
+        for slot in range(self.count):
+            if self.ips[slot] == ip:
+                return slot
+        return None
+
+    # Slot of a device heard from ip, taking a new slot for a new device.
+    # None when all max_remotes slots are taken.
+    def lookup(self, device_id, ip):
+        slot = None
+        for i in range(self.count):
+            if self.ids[i] == device_id:
+                slot = i
+                break
+        if slot is None:
+            slot = self.find(ip)
+            if slot is not None and self.ids[slot] is not None:
+                slot = None
+        if slot is None:
+            if self.count == self.max_remotes:
+                return None
+            slot = self.count
+            self.count += 1
+            print(f"Remote sensor {device_id:08x} found at {ip} (remote{slot})")
+        self.ids[slot] = device_id
+        if self.ips[slot] != ip:
+            if self.ips[slot] is not None:
+                print(f"Remote sensor remote{slot} moved from {self.ips[slot]} to {ip}")
+            # The address may have been handed over by DHCP
+            for i in range(self.count):
+                if self.ips[i] == ip:
+                    self.ips[i] = None
+            self.ips[slot] = ip
+        self.heard(slot)
+        return slot
+
+    def announced(self, slot, port, interval, location):
+        self.ports[slot] = port
+        self.ttls[slot] = 3 * interval
+        self.locations[slot] = location
+
+    def heard(self, slot):
+        self.seen[slot] = time.monotonic()
+
+    def alive(self, slot):
+        return self.seen[slot] is not None and time.monotonic() - self.seen[slot] <= self.ttls[slot]
+
+    def stats(self):
+        now = time.monotonic()
+        remotes = {}
+        for slot in range(self.count):
+            remotes["remote"+str(slot)] = {
+                "id": None if self.ids[slot] is None else "%08x" % self.ids[slot],
+                "ip": self.ips[slot],
+                "location": self.locations[slot],
+                "alive": self.alive(slot),
+                "last_seen": None if self.seen[slot] is None else round(now - self.seen[slot], 1),
+            }
+        return remotes
+
+############################
+# Remote sensors poller
+############################
+# Socket errors meaning "not ready yet" on a non-blocking socket
+WAIT_ERRNOS = (errno.EAGAIN, errno.EINPROGRESS, errno.EALREADY, errno.ENOTCONN)
+
+class RemotePoller:
+    def __init__(self, pool, registry, timeout):
+        self.pool = pool
+        self.registry = registry
+        self.timeout = timeout
+
+        num = registry.max_remotes
+        self.socks = [None] * num
+        self.sent = [False] * num
+        self.started = [0.0] * num
+        self.lengths = [0] * num
+        # Allocated on the first poll of a slot
+        self.buffers = [None] * num
+
+    def busy(self, dev):
+        return self.socks[dev] is not None
+
+    # Open a non-blocking connection to a remote; the request is sent
+    # once the connection completes in poll(). Returns (dev, None, error,
+    # elapsed) if the connection failed right away.
+    def start(self, dev):
+        host = self.registry.ips[dev]
+        if self.socks[dev] is not None or host is None:
+            return
+        if self.buffers[dev] is None:
+            self.buffers[dev] = bytearray(1024)
+        sock = self.pool.socket(self.pool.AF_INET, self.pool.SOCK_STREAM)
+        sock.setblocking(False)
+        self.started[dev] = time.monotonic()
+        try:
+            sock.connect((host, self.registry.ports[dev]))
+        except OSError as e:
+            if socketErrno(e) not in WAIT_ERRNOS:
+                sock.close()
+                print(f"Remote sensor {host} not available: {e}")
+                return (dev, None, str(e), time.monotonic() - self.started[dev])
+        self.socks[dev] = sock
+        self.sent[dev] = False
+        self.lengths[dev] = 0
+
+    def _close(self, dev):
+        try:
+            self.socks[dev].close()
+        except OSError:
+            pass
+        self.socks[dev] = None
+
+    def closeAll(self):
+        for dev in range(len(self.socks)):
+            if self.socks[dev] is not None:
+                self._close(dev)
+
+    def _parse(self, dev):
+        raw = bytes(memoryview(self.buffers[dev])[:self.lengths[dev]])
+        if raw[9:12] != b"200":
+            raise ValueError(f"HTTP status {raw[9:12]}")
+        body = raw[raw.find(b"\r\n\r\n") + 4:]
+        return json.loads(body.decode())
+
+    # Advance every request in flight without blocking. Returns a list of
+    # (dev, data, error, elapsed seconds) for the ones that completed.
+    def poll(self):
+        done = []
+        now = time.monotonic()
+        for dev in range(len(self.socks)):
+            sock = self.socks[dev]
+            if sock is None:
+                continue
+            host = self.registry.ips[dev]
+            elapsed = now - self.started[dev]
+            try:
+                if not self.sent[dev]:
+                    sock.send(b"GET /api/status HTTP/1.1\r\nHost: " + host.encode() + b"\r\nConnection: close\r\n\r\n")
+                    self.sent[dev] = True
+                buf = memoryview(self.buffers[dev])[self.lengths[dev]:]
+                if len(buf) == 0:
+                    raise ValueError("Response too large")
+                n = sock.recv_into(buf)
+                if n == 0:
+                    self._close(dev)
+                    done.append((dev, self._parse(dev), None, elapsed))
+                else:
+                    self.lengths[dev] += n
+            except OSError as e:
+                waiting = socketErrno(e) in WAIT_ERRNOS
+                if waiting and elapsed < self.timeout:
+                    continue
+                self._close(dev)
+                error = "Timeout" if waiting else str(e)
+                print(f"Remote sensor {host} not available: {error}")
+                done.append((dev, None, error, elapsed))
+            except Exception as e:
+                if self.socks[dev] is not None:
+                    self._close(dev)
+                print(f"Invalid response from remote sensor {host}: {e}")
+                done.append((dev, None, str(e), elapsed))
+        return done
+
+############################
+# Remote sensors health
+############################
+# Per-remote round-trip time and success rate (both EWMA), consecutive
+# failures and a circuit breaker: after BREAKER_THRESHOLD failures in a row
+# the remote is marked down and only probed again after a backoff that
+# doubles with each failed probe, up to max_backoff.
+BREAKER_THRESHOLD = 3
+HEALTH_ALPHA = 0.2
+
+class RemoteHealth:
+    def __init__(self, num_remotes, base_backoff, max_backoff):
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.rtt = [None] * num_remotes
+        self.success = [1.0] * num_remotes
+        self.attempts = [0] * num_remotes
+        self.failures = [0] * num_remotes
+        self.backoff = [base_backoff] * num_remotes
+        self.next_probe = [0.0] * num_remotes
+
+    def is_open(self, dev):
+        return self.failures[dev] >= BREAKER_THRESHOLD
+
+    # Closed: poll as usual. Open: only once the backoff has expired
+    def allow(self, dev):
+        return not self.is_open(dev) or time.monotonic() >= self.next_probe[dev]
+
+    def record(self, dev, ok, elapsed):
+        self.attempts[dev] += 1
+        self.success[dev] += HEALTH_ALPHA * ((1.0 if ok else 0.0) - self.success[dev])
+        if ok:
+            ms = elapsed * 1000
+            self.rtt[dev] = ms if self.rtt[dev] is None else self.rtt[dev] + HEALTH_ALPHA * (ms - self.rtt[dev])
+            self.reset(dev)
+            return
+        self.failures[dev] += 1
+        if self.is_open(dev):
+            if self.failures[dev] == BREAKER_THRESHOLD:
+                print(f"Remote sensor remote{dev} down, retrying in {self.backoff[dev]:.0f} s")
+            self.next_probe[dev] = time.monotonic() + self.backoff[dev]
+            self.backoff[dev] = min(self.backoff[dev] * 2, self.max_backoff)
+
+    # The remote answered (or pushed a reading): close the breaker
+    def reset(self, dev):
+        if self.is_open(dev):
+            print(f"Remote sensor remote{dev} back up")
+        self.failures[dev] = 0
+        self.backoff[dev] = self.base_backoff
+
+    def stats(self, dev):
+        if not self.is_open(dev):
+            breaker = "closed"
+        elif self.allow(dev):
+            breaker = "half-open"
+        else:
+            breaker = "open"
+        return {
+            "rtt_ms": None if self.rtt[dev] is None else round(self.rtt[dev], 1),
+            "success_rate": round(self.success[dev], 3),
+            "attempts": self.attempts[dev],
+            "consecutive_failures": self.failures[dev],
+            "breaker": breaker,
+            "next_probe": round(self.next_probe[dev] - time.monotonic(), 1) if breaker == "open" else None,
+        }
+
+############################
+# Remote sensors cache
+############################
+# Keys a pushed reading must have: the ones getDeviceData() reads
+REMOTE_READING_KEYS = ('state', 'temperature', 'RH', 'HI', 'IAQ', 'TVOC', 'eCO2', 'type', 'location')
+
+class RemoteCache:
+    def __init__(self, registry, max_age, refresh_interval, retry_interval, max_backoff):
+        self.poller = None
+        self.listener = None
+        self.registry = registry
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+
+        num = registry.max_remotes
+        self.data = [None] * num
+        self.sampled = [0.0] * num
+        self.pushed = [None] * num
+        self.errors = [None] * num
+        self.health = RemoteHealth(num, refresh_interval, max_backoff)
+
+        self.next_refresh = time.monotonic()
+        self.next_retry = self.next_refresh
+
+    # Payload returned when a remote was never reached
+    def placeholder(self):
+        return {'state': 'N/A',
+                'temperature': '--',
+                'pressure': '--',
+                'RH': '--',
+                'HI': '--',
+                'IAQ': '--',
+                'TVOC': '--',
+                'eCO2': '--',
+                'type': '--',
+                'location': ''}
+
+    def store(self, dev, data, error):
+        if data is not None:
+            self.data[dev] = data
+            self.sampled[dev] = time.monotonic()
+            self.errors[dev] = None
+            self.registry.heard(dev)
+            if self.listener is not None:
+                self.listener(dev)
+        else:
+            self.errors[dev] = error
+
+    # Reading posted by the remote itself to /api/ingest
+    def push(self, dev, data):
+        self.pushed[dev] = time.monotonic()
+        self.health.reset(dev)
+        self.store(dev, data, None)
+
+    # Remotes that pushed within max_age are not polled
+    def is_pushing(self, dev):
+        return self.pushed[dev] is not None and time.monotonic() - self.pushed[dev] <= self.max_age
+
+    # Always served from memory, the last good reading even while the
+    # remote is down: requests never wait on a remote
+    def get(self, dev):
+        if self.data[dev] is None:
+            return self.placeholder()
+        return self.data[dev]
+
+    # Age in seconds of the cached sample (None if never sampled)
+    def age(self, dev):
+        if self.data[dev] is None:
+            return None
+        return round(time.monotonic() - self.sampled[dev], 1)
+
+    def status(self, dev):
+        if self.health.is_open(dev) and not self.is_pushing(dev):
+            return "down"
+        if self.data[dev] is None:
+            return "unavailable"
+        if self.age(dev) > self.max_age:
+            return "stale"
+        return "ok"
+
+    def start(self, dev):
+        failed = self.poller.start(dev)
+        if failed is not None:
+            self.completed(*failed)
+
+    def completed(self, dev, data, error, elapsed):
+        self.health.record(dev, data is not None, elapsed)
+        self.store(dev, data, error)
+
+    # Called from the main loop: every refresh_interval start polling the
+    # live remotes not pushing their readings, except those marked down and
+    # waiting for their next probe, and collect whatever completed. Remotes
+    # not heard from lately are only retried every retry_interval.
+    def service(self):
+        if self.poller is None or self.registry.count == 0:
+            return
+        now = time.monotonic()
+        if now >= self.next_refresh:
+            retry = now >= self.next_retry
+            if retry:
+                self.next_retry = now + self.retry_interval
+            for dev in range(self.registry.count):
+                if self.is_pushing(dev) or not self.health.allow(dev):
+                    continue
+                if retry or self.registry.alive(dev):
+                    self.start(dev)
+            self.next_refresh = now + self.refresh_interval
+        for result in self.poller.poll():
+            self.completed(*result)
+
+############################
+# UDP telemetry
+############################
+# Datagram header: magic, protocol version, message type, device id,
+# sequence number, sender uptime (ms). Must match remote_sensor/code.py
+TELEMETRY_MAGIC = b"GO"
+TELEMETRY_VERSION = 1
+TELEMETRY_HEADER = "<2sBBIHL"
+MSG_READING = 1
+MSG_ANNOUNCE = 2
+MSG_PROBE = 3
+
+# Reading: scaled TELEMETRY_FIELDS, door index (-1: N/A), reading type
+TELEMETRY_READING = "<7hbB"
+TELEMETRY_FIELDS = ('temperature', 'RH', 'pressure', 'IAQ', 'TVOC', 'eCO2', 'HI')
+TELEMETRY_SCALE = (10, 10, 1, 1, 1, 1, 10)
+TELEMETRY_MISSING = -32768
+READING_TYPES = ("sensor", "CPU adj", "CPU raw", "CPU adj.")
+
+# Announce: HTTP port, announce interval (s), then the location in UTF-8.
+# Probe: header only.
+TELEMETRY_ANNOUNCE = "<HH"
+
+# Reading payload as the dict a remote serves at /api/status; fields not
+# carried over UDP (location, ...) are kept from the previous reading.
+def decodeReading(payload, previous):
+    values = struct.unpack_from(TELEMETRY_READING, payload)
+    data = dict(previous) if previous else {'location': ''}
+    for c in range(len(TELEMETRY_FIELDS)):
+        v = values[c]
+        if v == TELEMETRY_MISSING:
+            data[TELEMETRY_FIELDS[c]] = '--'
+        elif TELEMETRY_SCALE[c] == 1:
+            data[TELEMETRY_FIELDS[c]] = str(v)
+        else:
+            data[TELEMETRY_FIELDS[c]] = str(v / TELEMETRY_SCALE[c])
+    door = values[-2]
+    data['state'] = DOOR_STATES[door] if door >= 0 else "N/A"
+    kind = values[-1]
+    data['type'] = READING_TYPES[kind] if kind < len(READING_TYPES) else '--'
+    return data
+
+# Receives telemetry datagrams from the main loop and hands each message
+# to the handler registered for its type. Sequence numbers are tracked per
+# device to count lost, duplicate and late datagrams.
+class TelemetryListener:
+    def __init__(self, pool, port, max_per_call=8):
+        self.sock = pool.socket(pool.AF_INET, pool.SOCK_DGRAM)
+        self.sock.bind(("0.0.0.0", port))
+        self.sock.setblocking(False)
+        try:
+            self.sock.setsockopt(pool.SOL_SOCKET, pool.SO_BROADCAST, 1)
+        except (AttributeError, OSError):
+            # Not exposed by every port; lwIP sends broadcasts without it
+            pass
+        self.port = port
+        self.max_per_call = max_per_call
+        self.buffer = bytearray(256)
+        self.header_size = struct.calcsize(TELEMETRY_HEADER)
+        self.device_id = int.from_bytes(bytes(wifi.radio.mac_address)[2:], "big")
+        self.seq = 0
+
+        self.handlers = {}      # message type -> handler(device_id, ip, payload)
+        self.devices = {}       # device id -> [seq, uptime, received, lost, late, restarts]
+        self.invalid = 0
+
+    # False for a duplicate or late datagram
+    def track(self, device_id, seq, uptime):
+        st = self.devices.get(device_id)
+        if st is None:
+            self.devices[device_id] = [seq, uptime, 1, 0, 0, 0]
+            return True
+        # Uptime going back means the sender rebooted (or wrapped after
+        # 49 days): its sequence starts over.
+        if uptime < st[1]:
+            st[5] += 1
+        else:
+            delta = (seq - st[0]) & 0xFFFF
+            if delta == 0 or delta >= 0x8000:
+                st[4] += 1
+                return False
+            st[3] += delta - 1
+        st[0] = seq
+        st[1] = uptime
+        st[2] += 1
+        return True
+
+    def receive(self, n, ip):
+        if n < self.header_size:
+            self.invalid += 1
+            return
+        magic, ver, msg_type, device_id, seq, uptime = struct.unpack_from(TELEMETRY_HEADER, self.buffer)
+        if magic != TELEMETRY_MAGIC or ver != TELEMETRY_VERSION:
+            self.invalid += 1
+            return
+        handler = self.handlers.get(msg_type)
+        if handler is None or not self.track(device_id, seq, uptime):
+            return
+        try:
+            handler(device_id, ip, memoryview(self.buffer)[self.header_size:n])
+        except (ValueError, IndexError) as e:
+            self.invalid += 1
+            print(f"Invalid telemetry from {ip}: {e}")
+
+    # Sends a header-only message (MSG_PROBE) from the listening port
+    def send(self, msg_type, address):
+        header = struct.pack(TELEMETRY_HEADER, TELEMETRY_MAGIC, TELEMETRY_VERSION, msg_type,
+                             self.device_id, self.seq,
+                             (time.monotonic_ns() // 1_000_000) & 0xFFFFFFFF)
+        self.seq = (self.seq + 1) & 0xFFFF
+        self.sock.sendto(header, address)
+
+    # Called from the main loop: handle the datagrams waiting, if any.
+    # Returns the number received.
+    def service(self):
+        for count in range(self.max_per_call):
+            try:
+                n, addr = self.sock.recvfrom_into(self.buffer)
+            except OSError as e:
+                if socketErrno(e) in WAIT_ERRNOS:
+                    return count
+                raise
+            self.receive(n, addr[0])
+        return self.max_per_call
+
+    def stats(self):
+        devices = {}
+        for device_id, st in self.devices.items():
+            expected = st[2] + st[3]
+            devices["%08x" % device_id] = {
+                "seq": st[0],
+                "received": st[2],
+                "lost": st[3],
+                "late": st[4],
+                "restarts": st[5],
+                "loss_rate": round(st[3] / expected, 3) if expected else 0,
+            }
+        return {"port": self.port, "invalid": self.invalid, "devices": devices}
+
+############################
+# Remote sensors discovery
+############################
+# A probe is broadcast on the telemetry port at boot and every interval.
+# Remotes answer it, and announce themselves on their own when they boot
+# and every announce interval; each announcement refreshes the registry.
+class Discovery:
+    def __init__(self, listener, registry, interval):
+        self.listener = listener
+        self.registry = registry
+        self.interval = interval
+        self.address = (broadcastAddress(), listener.port)
+        self.announce_size = struct.calcsize(TELEMETRY_ANNOUNCE)
+        self.next_probe = time.monotonic()
+        self.probes = 0
+        self.announcements = 0
+        listener.handlers[MSG_ANNOUNCE] = self.onAnnounce
+
+    def onAnnounce(self, device_id, ip, payload):
+        port, interval = struct.unpack_from(TELEMETRY_ANNOUNCE, payload)
+        location = bytes(payload[self.announce_size:]).decode()
+        self.announcements += 1
+        slot = self.registry.lookup(device_id, ip)
+        if slot is None:
+            print(f"Remote sensor at {ip} ignored: {self.registry.max_remotes} remotes already known")
+            return
+        self.registry.announced(slot, port, interval, location)
+
+    # Called from the main loop
+    def service(self):
+        now = time.monotonic()
+        if now < self.next_probe:
+            return
+        self.next_probe = now + self.interval
+        try:
+            self.listener.send(MSG_PROBE, self.address)
+            self.probes += 1
+        except OSError as e:
+            print(f"Discovery probe to {self.address[0]} failed: {e}")
+
+    def stats(self):
+        return {"broadcast": self.address[0],
+                "probes": self.probes,
+                "announcements": self.announcements,
+                "next_probe": round(self.next_probe - time.monotonic(), 1)}
+
+############################
+# WebSocket push channel
+############################
+class PushChannel:
+    def __init__(self, max_clients):
+        self.max_clients = max_clients
+        self.clients = []
+        self.new_clients = []
+
+        # Last values pushed: door state and per-device fields
+        self.door = None
+        self.devices = {}
+
+    def accept(self, request):
+        if len(self.clients) + len(self.new_clients) >= self.max_clients:
+            print("WebSocket: client limit reached")
+            return None
+        ws = Websocket(request)
+        self.new_clients.append(ws)
+        return ws
+
+    def send(self, message):
+        for ws in self.clients:
+            try:
+                ws.send_message(message, fail_silently=True)
+            except OSError:
+                ws.close()
+
+    def closeAll(self):
+        for ws in self.clients + self.new_clients:
+            try:
+                ws.close()
+            except OSError:
+                pass
+        self.clients = []
+        self.new_clients = []
+
+    def publishDoor(self, state):
+        if state != self.door:
+            self.door = state
+            self.send(json.dumps({"door": state}))
+
+    # Push only the fields that changed since the last update of a device
+    def publish(self, dev, data):
+        last = self.devices.get(dev, {})
+        changed = {}
+        for key, value in data.items():
+            if key != "age" and last.get(key) != value:
+                changed[key] = value
+        self.devices[dev] = data
+        if changed:
+            changed["age"] = data.get("age")
+            self.send(json.dumps({"devices": {dev: changed}}))
+
+    # Called from the main loop: greet new clients with the full
+    # snapshot, answer pings and drop closed sockets.
+    def service(self):
+        for ws in self.new_clients:
+            try:
+                ws.send_message(json.dumps({"door": self.door, "devices": self.devices}), fail_silently=True)
+                self.clients.append(ws)
+            except OSError:
+                ws.close()
+        self.new_clients = []
+        for ws in self.clients:
+            try:
+                ws.receive(fail_silently=True)
+            except OSError:
+                ws.close()
+        self.clients = [ws for ws in self.clients if not ws.closed]
+
+############################
+# Door notifications
+############################
+# Queues a message when the filtered door state settles on OPEN or CLOSED,
+# and once per opening when the door stays open longer than open_alert seconds.
+class DoorWatch:
+    def __init__(self, outbox, open_alert):
+        self.outbox = outbox
+        self.open_alert = open_alert
+        self.state = None
+        self.open_since = None
+        self.alerted = False
+
+    def service(self, state):
+        now = time.monotonic()
+        if state in ("OPEN", "CLOSED") and state != self.state:
+            if self.state is not None:
+                text = "Door " + state
+                if state == "CLOSED" and self.open_since is not None:
+                    text += " after %d min" % ((now - self.open_since) // 60)
+                self.outbox.add(text)
+            self.state = state
+            self.open_since = now if state == "OPEN" else None
+            self.alerted = False
+
+        if self.open_alert and self.open_since is not None and not self.alerted \
+                and now - self.open_since >= self.open_alert:
+            self.alerted = True
+            self.outbox.add("Door open for more than %d min" % (self.open_alert // 60))
+
+# Bounded queue of notifications for the mail backend (/trigger-email).
+# Messages queued within batch_delay go out as one email; failed sends are
+# retried with exponential backoff. Sending is a blocking HTTPS request, so
+# it is only attempted when the main loop had no request to serve.
+class MailOutbox:
+    def __init__(self, url, api_key, recipient, size, batch_delay, timeout, clock):
+        self.url = url
+        self.api_key = api_key
+        self.recipient = recipient
+        self.size = size
+        self.batch_delay = batch_delay
+        self.timeout = timeout
+        self.clock = clock
+        self.session = None
+
+        self.queue = []     # (time, text)
+        self.sent = 0
+        self.dropped = 0
+        self.failures = 0
+        self.last_error = None
+        self.next_attempt = 0.0
+        self.backoff_base = 10.0
+        self.backoff_max = 600.0
+
+    def add(self, text):
+        if not self.url:
+            return
+        print(f"Notification queued: {text}")
+        if len(self.queue) >= self.size:
+            self.queue.pop(0)
+            self.dropped += 1
+        if not self.queue and not self.failures:
+            self.next_attempt = time.monotonic() + self.batch_delay
+        self.queue.append((formatUTC(self.clock()), text))
+
+    def payload(self, batch):
+        subject = "Garage: " + batch[-1][1]
+        if len(batch) > 1:
+            subject += " (+%d more)" % (len(batch) - 1)
+        body = "\n".join(t + "  " + text for t, text in batch)
+        data = {"api_secret_key": self.api_key,
+                "subject": subject,
+                "body": body + "\n\nPicoGarageOpener v." + version}
+        if self.recipient:
+            data["recipient"] = self.recipient
+        return data
+
+    # Called from the main loop with idle=True when no request was handled.
+    # Held while hold is set (e.g. the relay is pulsing: the POST blocks).
+    def service(self, idle, hold=False):
+        if not self.queue or self.session is None or not idle or hold:
+            return
+        if time.monotonic() < self.next_attempt:
+            return
+
+        batch = self.queue[:]
+        status = None
+        try:
+            response = self.session.post(self.url, json=self.payload(batch), timeout=self.timeout)
+            status = response.status_code
+            response.close()
+            self.last_error = None if status == 200 else "HTTP " + str(status)
+        except Exception as e:
+            self.last_error = str(e)
+
+        if status == 200 or status in (400, 403):
+            # Delivered, or rejected for good (bad key or payload): don't retry
+            if status != 200:
+                print(f"Notification rejected by mail backend: {self.last_error}")
+                self.dropped += len(batch)
+            else:
+                self.sent += len(batch)
+            del self.queue[:len(batch)]
+            self.failures = 0
+            self.next_attempt = time.monotonic() + self.batch_delay
+            return
+
+        self.failures += 1
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (self.failures - 1))
+        self.next_attempt = time.monotonic() + delay
+        print(f"Notification failed ({self.last_error}), retry in {delay} s")
+
+    def stats(self):
+        return {
+            "queued": len(self.queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+############################
+# History
+############################
+HISTORY_FIELDS = ('temperature', 'RH', 'pressure', 'IAQ', 'TVOC', 'eCO2')
+HISTORY_SCALE = (10, 10, 1, 1, 1, 1)
+HISTORY_MISSING = -32768
+DOOR_STATES = ("CLOSED", "OPEN", "MOVING")
+
+# JSON array for one history row: time, scaled values, door index
+def formatHistoryRow(t, record):
+    values = [str(t)]
+    for c in range(len(HISTORY_FIELDS)):
+        v = record[c]
+        if v == HISTORY_MISSING:
+            values.append("null")
+        elif HISTORY_SCALE[c] == 1:
+            values.append(str(v))
+        else:
+            values.append(str(v / HISTORY_SCALE[c]))
+    d = record[-1]
+    values.append('"' + DOOR_STATES[d] + '"' if d >= 0 else "null")
+    return "[" + ",".join(values) + "]"
+
+class HistoryStore:
+    def __init__(self, size, decimation):
+        self.size = size
+        self.decimation = max(1, decimation)
+
+        # Parallel fixed-size columns: readings as scaled int16,
+        # door state as index in DOOR_STATES (-1 for N/A)
+        self.times = array('L', [0] * size)
+        self.columns = [array('h', [HISTORY_MISSING] * size) for _ in HISTORY_FIELDS]
+        self.door = array('b', [-1] * size)
+        self.index = 0
+        self.count = 0
+        self.skipped = self.decimation - 1
+        # Times are uptime seconds until the clock first syncs
+        self.time_base = "uptime"
+
+    # Returns the row index when the sample was kept, None when decimated
+    def add(self, t, data, state):
+        self.skipped += 1
+        if self.skipped < self.decimation:
+            return None
+        self.skipped = 0
+
+        i = self.index
+        self.times[i] = int(t)
+        for c in range(len(HISTORY_FIELDS)):
+            try:
+                v = int(round(float(data[HISTORY_FIELDS[c]]) * HISTORY_SCALE[c]))
+                if v < -32767 or v > 32767:
+                    v = HISTORY_MISSING
+            except (KeyError, ValueError):
+                v = HISTORY_MISSING
+            self.columns[c][i] = v
+        self.door[i] = DOOR_STATES.index(state) if state in DOOR_STATES else -1
+        self.index = (i + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        return i
+
+    # First clock sync: shift the rows stored so far from uptime to UTC
+    def rebase(self, offset):
+        start = (self.index - self.count) % self.size
+        for n in range(self.count):
+            i = (start + n) % self.size
+            self.times[i] += offset
+        self.time_base = "utc"
+
+    # Scaled values and door index of row i, in HISTORY_RECORD order
+    def record(self, i):
+        return [self.columns[c][i] for c in range(len(HISTORY_FIELDS))] + [self.door[i]]
+
+    def row(self, i):
+        return formatHistoryRow(self.times[i], self.record(i))
+
+    # Generator of JSON fragments, oldest first, a few rows per chunk
+    def stream(self, since=0, rows_per_chunk=16):
+        yield '{"fields":["t","' + '","'.join(HISTORY_FIELDS) + '","door"],'
+        yield '"time_base":"' + self.time_base + '","decimation":' + str(self.decimation) + ',"rows":['
+        start = (self.index - self.count) % self.size
+        count = self.count
+        chunk = []
+        first = True
+        for n in range(count):
+            i = (start + n) % self.size
+            if self.times[i] < since:
+                continue
+            chunk.append(self.row(i))
+            if len(chunk) >= rows_per_chunk:
+                yield ("" if first else ",") + ",".join(chunk)
+                first = False
+                chunk = []
+        if chunk:
+            yield ("" if first else ",") + ",".join(chunk)
+        yield "]}"
+
+############################
+# History log (flash)
+############################
+# Segment header: magic, version, record size, reserved
+HISTORY_LOG_MAGIC = b"GOPH"
+HISTORY_LOG_VERSION = 1
+HISTORY_LOG_HEADER = "<4sBBH"
+# Record: UTC seconds, scaled HISTORY_FIELDS, door index
+HISTORY_RECORD = "<Lhhhhhhb"
+
+class HistoryLog:
+    def __init__(self, path, segment_size, max_segments, batch):
+        self.path = path
+        self.segment_size = segment_size
+        self.max_segments = max(2, max_segments)
+        self.header_size = struct.calcsize(HISTORY_LOG_HEADER)
+        self.record_size = struct.calcsize(HISTORY_RECORD)
+
+        # Records are accumulated here and appended to flash in one write
+        self.buffer = bytearray(batch * self.record_size)
+        self.batch = batch
+        self.pending = 0
+
+        # Tail index: [segment number, first t, last t, count], oldest first
+        self.index = []
+        try:
+            os.mkdir(path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        self.load_index()
+        print(f"History log: {len(self.index)} segments in {path}")
+
+    def segment_name(self, seg):
+        return f"{self.path}/seg{seg:05d}.bin"
+
+    def read_time(self, f, n):
+        f.seek(self.header_size + n * self.record_size)
+        return struct.unpack("<L", f.read(4))[0]
+
+    def load_index(self):
+        names = sorted([n for n in os.listdir(self.path) if n.startswith("seg") and n.endswith(".bin")])
+        torn = False
+        for name in names:
+            seg = int(name[3:-4])
+            size = os.stat(self.path + "/" + name)[6]
+            if size < self.header_size:
+                print(f"History log: skipping invalid segment {name}")
+                continue
+            count = (size - self.header_size) // self.record_size
+            with open(self.path + "/" + name, "rb") as f:
+                magic, ver, rec_size, _ = struct.unpack(HISTORY_LOG_HEADER, f.read(self.header_size))
+                if magic != HISTORY_LOG_MAGIC or rec_size != self.record_size:
+                    print(f"History log: skipping invalid segment {name}")
+                    continue
+                if count > 0:
+                    self.index.append([seg, self.read_time(f, 0), self.read_time(f, count - 1), count])
+                else:
+                    self.index.append([seg, None, None, 0])
+            torn = (size - self.header_size) % self.record_size != 0
+
+        # Power lost during a write: the last segment ends in a partial
+        # record, and appending after it would misalign every later one.
+        # Files cannot be truncated on CircuitPython, so the segment is
+        # closed as it is (its whole records stay readable) and a new one
+        # takes the next records.
+        if torn:
+            print(f"History log: partial record at the end of {self.segment_name(self.index[-1][0])}")
+            self.new_segment()
+
+    def new_segment(self):
+        seg = self.index[-1][0] + 1 if self.index else 0
+        with open(self.segment_name(seg), "wb") as f:
+            f.write(struct.pack(HISTORY_LOG_HEADER, HISTORY_LOG_MAGIC, HISTORY_LOG_VERSION, self.record_size, 0))
+        self.index.append([seg, None, None, 0])
+        while len(self.index) > self.max_segments:
+            old = self.index.pop(0)
+            os.remove(self.segment_name(old[0]))
+
+    def add(self, t, record):
+        struct.pack_into(HISTORY_RECORD, self.buffer, self.pending * self.record_size, t, *record)
+        self.pending += 1
+        if self.pending >= self.batch:
+            self.flush()
+
+    # Append the pending batch, rotating segments when full
+    def flush(self):
+        done = 0
+        while done < self.pending:
+            if not self.index or self.index[-1][3] >= self.segment_size:
+                self.new_segment()
+            entry = self.index[-1]
+            n = min(self.pending - done, self.segment_size - entry[3])
+            start = done * self.record_size
+            with open(self.segment_name(entry[0]), "ab") as f:
+                f.write(memoryview(self.buffer)[start:start + n * self.record_size])
+            if entry[1] is None:
+                entry[1] = struct.unpack_from("<L", self.buffer, start)[0]
+            entry[2] = struct.unpack_from("<L", self.buffer, start + (n - 1) * self.record_size)[0]
+            entry[3] += n
+            done += n
+        self.pending = 0
+
+    # First record with t >= since, by binary search over fixed-size records
+    def seek(self, f, count, since):
+        lo = 0
+        hi = count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.read_time(f, mid) < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def stream(self, since=0, rows_per_chunk=16):
+        yield '{"fields":["t","' + '","'.join(HISTORY_FIELDS) + '","door"],'
+        yield '"time_base":"utc","rows":['
+        first = True
+        buf = bytearray(rows_per_chunk * self.record_size)
+        # A copy: the stream is resumed across loop passes, and flush() may
+        # rotate out (and delete) the oldest segment in between
+        for seg, first_t, last_t, count in list(self.index):
+            if count == 0 or last_t < since:
+                continue
+            try:
+                with open(self.segment_name(seg), "rb") as f:
+                    n = self.seek(f, count, since) if first_t < since else 0
+                    while n < count:
+                        f.seek(self.header_size + n * self.record_size)
+                        k = min(rows_per_chunk, count - n)
+                        f.readinto(memoryview(buf)[:k * self.record_size])
+                        rows = []
+                        for j in range(k):
+                            r = struct.unpack_from(HISTORY_RECORD, buf, j * self.record_size)
+                            rows.append(formatHistoryRow(r[0], r[1:]))
+                        yield ("" if first else ",") + ",".join(rows)
+                        first = False
+                        n += k
+            except OSError:
+                # Segment removed since the copy was taken
+                continue
+        rows = []
+        for j in range(self.pending):
+            r = struct.unpack_from(HISTORY_RECORD, self.buffer, j * self.record_size)
+            if r[0] >= since:
+                rows.append(formatHistoryRow(r[0], r[1:]))
+        if rows:
+            yield ("" if first else ",") + ",".join(rows)
+        yield "]}"
+
 ############################
 # Control
 ############################
@@ -363,11 +2498,47 @@ class Control:
         self.btn.direction = digitalio.Direction.OUTPUT
         self.btn.value = False
 
+        # Relay is held for pulse_time, further presses are ignored
+        # until hold_off has also elapsed
+        self.pulse_time = 2.0
+        self.hold_off = 1.0
+        self.op_id = 0
+        self.op_start = 0.0
+        self.pulse_end = None
+        self.busy_until = 0.0
+
+    # Start a relay pulse; returns (operation id, started). Presses inside
+    # the active window are coalesced into the running operation.
     def runControl(self):
+        now = time.monotonic()
+        if now < self.busy_until:
+            return self.op_id, False
+        self.op_id += 1
+        self.op_start = now
         self.btn.value = True
-        time.sleep(2)
-        self.btn.value = False
-        time.sleep(1)
+        self.pulse_end = now + self.pulse_time
+        self.busy_until = self.pulse_end + self.hold_off
+        return self.op_id, True
+
+    # Called from the main loop: release the relay when the pulse is over
+    def service(self):
+        if self.pulse_end is not None and time.monotonic() >= self.pulse_end:
+            self.btn.value = False
+            self.pulse_end = None
+
+    def getStatus(self):
+        now = time.monotonic()
+        if self.pulse_end is not None:
+            state = "pulsing"
+        elif now < self.busy_until:
+            state = "settling"
+        else:
+            state = "idle"
+        return {"operation_id": self.op_id,
+                "state": state,
+                "relay": self.btn.value,
+                "elapsed": round(now - self.op_start, 2) if self.op_id else None,
+                "remaining": round(max(0, self.busy_until - now), 2)}
 
 ############################
 # Sensors
@@ -381,12 +2552,21 @@ class Sensors:
         if self.sonar_location == "loc":
             self.sonar = None
             try:
+                # Only needed with the sonar wired to the hub
+                import adafruit_hcsr04
                 self.sonar = adafruit_hcsr04.HCSR04(trigger_pin=SONAR_TRIGGER, echo_pin=SONAR_ECHO)
                 print("Sonar HCSR04 initialized")
             except Exception as e:
                 print(f"Failed to initialize HCSR04: {e}")
             self.trigger_distance = conf.trigger_distance
 
+        self.sonarSampler = None
+        if self.sonar_location == "loc" and self.sonar:
+            self.sonarSampler = SonarSampler(self.sonar, conf.trigger_distance,
+                                             conf.sonar_hysteresis,
+                                             conf.sonar_fast_interval,
+                                             conf.sonar_slow_interval)
+
         self.envSensor1 = None
         self.envSensor1_name = conf.sensor1_name
         self.envSensor1_pins = conf.sensor1_pins
@@ -405,6 +2585,8 @@ class Sensors:
 
         self.numTimes = 1
 
+        self.envSampler = EnvSampler(self, conf.env_sample_interval)
+
     def getEnvData(self, envSensor, envSensor_name, correct_temp):
         t_cpu = microcontroller.cpu.temperature
         if not envSensor:
@@ -435,11 +2617,9 @@ class Sensors:
             self.avDeltaT = (self.avDeltaT * self.numTimes + delta_t)/(self.numTimes+1)
             self.numTimes += 1
             print(f"Av. CPU/MCP T diff: {self.avDeltaT} {self.numTimes}")
-            time.sleep(0.5)
             return envSensorData
         except:
             print(f"{envSensor_name} not available. Av CPU/MCP T diff: {self.avDeltaT}")
-            time.sleep(0.5)
             return {'temperature': f"{round(t_cpu-self.avDeltaT, 1)}",
                     'RH': '--',
                     'pressure': '--',
@@ -449,28 +2629,142 @@ class Sensors:
                     'HI': '--',
                     'type': 'CPU adj'}
 
-    # Enable for Sonar in main device
-    def checkStatusSonar(self):
-        if not self.sonar:
-            print("Sonar not initialized.")
+    # Filtered door state; no side effects, it is read on every loop pass
+    def doorState(self):
+        if self.sonarSampler is None:
             return "N/A"
-        nt = 0
-        while nt < 2:
-            try:
-                dist = self.sonar.distance
-                print("Distance: "+str(dist))
-                if dist < self.trigDist:
-                    return "OPEN"
-                else:
-                    return "CLOSED"
-                time.sleep(0.5)
-                return st
-            except RuntimeError as err:
-                print(f" Check Sonar Status: Retrying! Error: {err}")
-                nt += 1
-                time.sleep(0.5)
-        print(" Sonar status not available")
-        return "N/A"
+        return self.sonarSampler.state
+
+############################
+# Environmental sampler
+############################
+class EnvSampler:
+    def __init__(self, sensors, interval):
+        self.sensors = sensors
+        self.interval = interval
+        self.last = None
+        self.last_time = 0.0
+        self.next_sample = time.monotonic()
+        # Set by the server: stamps each sample with Clock.time()
+        self.clock = None
+        self.last_stamp = None
+
+    def sample(self):
+        s = self.sensors
+        self.last = s.getEnvData(s.envSensor1, s.envSensor1_name, s.sensor1_correct_temp)
+        self.last_time = time.monotonic()
+        if self.clock is not None:
+            self.last_stamp = self.clock.time()
+
+    # Called from the main loop; returns True when a new sample was taken
+    def service(self):
+        now = time.monotonic()
+        if now >= self.next_sample:
+            self.next_sample = now + self.interval
+            self.sample()
+            return True
+        return False
+
+    # Latest sample, read synchronously only before the first scheduled one
+    def latest(self):
+        if self.last is None:
+            self.sample()
+        return self.last
+
+    def age(self):
+        if self.last is None:
+            return None
+        return round(time.monotonic() - self.last_time, 1)
+
+############################
+# Sonar sampler
+############################
+class SonarSampler:
+    def __init__(self, sonar, trigger_distance, hysteresis, fast_interval, slow_interval, window=5):
+        self.sonar = sonar
+        self.trigger_distance = trigger_distance
+        self.hysteresis = hysteresis
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.window = window
+
+        self.readings = array('f', [0.0] * window)
+        self.index = 0
+        self.count = 0
+        self.failures = 0
+        self.stable = 0
+
+        self.distance = None
+        self.state = "N/A"
+        self.interval = fast_interval
+        self.next_sample = time.monotonic()
+
+    def median(self):
+        values = sorted(self.readings[:self.count])
+        return values[self.count // 2]
+
+    # Door state from the filtered distance, holding the previous
+    # state while inside the hysteresis band around trigger_distance.
+    def classify(self, dist):
+        if dist < self.trigger_distance - self.hysteresis:
+            return "OPEN"
+        if dist > self.trigger_distance + self.hysteresis:
+            return "CLOSED"
+        if self.state in ("OPEN", "CLOSED"):
+            return self.state
+        return "OPEN" if dist < self.trigger_distance else "CLOSED"
+
+    def sample(self):
+        try:
+            dist = self.sonar.distance
+        except RuntimeError as err:
+            self.failures += 1
+            if self.failures >= self.window:
+                print(f" Sonar status not available: {err}")
+                self.state = "N/A"
+                # Start the window over: the next median is of fresh readings only
+                self.index = 0
+                self.count = 0
+                self.interval = self.slow_interval
+            return
+
+        self.failures = 0
+        # A raw reading away from the filtered distance means the door may
+        # be moving: sample fast right away, before the median follows
+        if self.distance is not None and abs(dist - self.distance) > self.hysteresis:
+            self.stable = 0
+            self.interval = self.fast_interval
+
+        self.readings[self.index] = dist
+        self.index = (self.index + 1) % self.window
+        self.count = min(self.count + 1, self.window)
+
+        previous = self.distance
+        self.distance = self.median()
+
+        if previous is not None and abs(self.distance - previous) > self.hysteresis:
+            # Distance is changing: door is moving, sample fast
+            if self.state != "MOVING":
+                print(f"Door moving. Distance: {self.distance}")
+            self.state = "MOVING"
+            self.stable = 0
+            self.interval = self.fast_interval
+            return
+
+        self.stable += 1
+        state = self.classify(self.distance)
+        if state != self.state:
+            print(f"Door {state}. Distance: {self.distance}")
+            self.state = state
+        if self.stable >= self.window:
+            self.interval = self.slow_interval
+
+    # Called from the main loop
+    def service(self):
+        now = time.monotonic()
+        if now >= self.next_sample:
+            self.sample()
+            self.next_sample = time.monotonic() + self.interval
 
 ############################
 # Utilities
@@ -487,14 +2781,43 @@ def stringToArray(string):
         print("Warning: Initial string-array not found in settings.toml")
         return []
 
+# errno of a socket error; None when the exception carries none
+def socketErrno(e):
+    err = getattr(e, "errno", None)
+    if err is None and e.args and isinstance(e.args[0], int):
+        err = e.args[0]
+    return err
+
+# Directed broadcast address of the WiFi subnet (e.g. 192.168.1.255)
+def broadcastAddress():
+    try:
+        ip = str(wifi.radio.ipv4_address).split('.')
+        mask = str(wifi.radio.ipv4_subnet).split('.')
+        return '.'.join(str(int(ip[i]) | (~int(mask[i]) & 0xFF)) for i in range(4))
+    except (AttributeError, IndexError, ValueError):
+        return "255.255.255.255"
+
+# "YYYY-MM-DD hh:mm:ss UTC" from UTC seconds
+def formatUTC(secs):
+    if not secs:
+        return "(time not set)"
+    t = time.localtime(secs)
+    return "%04d-%02d-%02d %02d:%02d:%02d UTC" % (t.tm_year, t.tm_mon, t.tm_mday,
+                                                  t.tm_hour, t.tm_min, t.tm_sec)
+
 ############################
 # Main
 ############################
 def main():
+    boot = BootTimer(boot_start)
+    boot.mark("imports")
     conf = Conf()
+    boot.mark("conf")
     control = Control()
+    boot.mark("control")
     sensors = Sensors(conf)
-    server = GarageServer(control, sensors)
+    boot.mark("sensors")
+    server = GarageServer(control, sensors, boot)
 
     server.serve_forever()
 
@@ -0,0 +1,81 @@
+// Pico Garage Opener - service worker
+// The static shell is precached so the dashboard opens instantly, even while
+// the Pico is busy or rebooting. Status calls are stale-while-revalidate: the
+// last snapshot answers at once, the fresh one is cached and posted to the page.
+// Bump CACHE_VERSION when the list of shell files changes.
+
+const CACHE_VERSION = 1;
+const SHELL_CACHE = "shell-v" + CACHE_VERSION;
+const STATUS_CACHE = "status-v" + CACHE_VERSION;
+const SHELL_FILES = [
+    "/",
+    "/simple.html",
+    "/manifest.json",
+    "/favicon.ico",
+    "/icon.png",
+    "/icon192.png",
+];
+const STATUS_PATHS = ["/api/status", "/api/status/all"];
+
+self.addEventListener("install", (event) => {
+    event.waitUntil(
+        caches.open(SHELL_CACHE)
+            .then((cache) => cache.addAll(SHELL_FILES))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener("activate", (event) => {
+    event.waitUntil(
+        caches.keys()
+            .then((keys) => Promise.all(keys
+                .filter((key) => key !== SHELL_CACHE && key !== STATUS_CACHE)
+                .map((key) => caches.delete(key))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener("fetch", (event) => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (request.method !== "GET" || url.origin !== self.location.origin) {
+        return;
+    }
+    if (STATUS_PATHS.includes(url.pathname)) {
+        event.respondWith(staleWhileRevalidate(event, STATUS_CACHE, true));
+    }
+    else if (SHELL_FILES.includes(url.pathname)) {
+        event.respondWith(staleWhileRevalidate(event, SHELL_CACHE, false));
+    }
+    // Anything else (/api/run, /api/history, /ws, weather feeds) goes to the network
+});
+
+// Answer from cache when possible and refresh it in the background.
+// With notify, the refreshed JSON is posted to the page that asked for it.
+async function staleWhileRevalidate(event, cacheName, notify) {
+    const cache = await caches.open(cacheName);
+    const cached = await cache.match(event.request);
+
+    const refresh = fetch(event.request).then(async (response) => {
+        if (response.ok) {
+            await cache.put(event.request, response.clone());
+            if (cached && notify) {
+                await postStatus(event.clientId, event.request.url, await response.clone().json());
+            }
+        }
+        return response;
+    });
+
+    if (cached) {
+        event.waitUntil(refresh.catch(() => {}));
+        return cached;
+    }
+    return refresh;
+}
+
+async function postStatus(clientId, url, data) {
+    const client = await self.clients.get(clientId);
+    if (client) {
+        client.postMessage({type: "status", url: url, data: data});
+    }
+}
@@ -1,11 +1,11 @@
 # **********************************************
 # * Garage Opener - Rasperry Pico W
 # * Environmental and remote sonar only
-# * v2025.12.02.1
+# * v2026.10.18.1
 # * By: Nicola Ferralis <feranick@hotmail.com>
 # **********************************************
 
-version = "2025.12.02.1"
+version = "2026.10.18.1"
 
 import wifi
 import time
@@ -18,10 +18,13 @@ import digitalio
 import socketpool
 import ssl
 import json
+import errno
+import struct
+from array import array
 
 #import adafruit_requests
 #import adafruit_ntp
-from adafruit_httpserver import Server, MIMETypes, Response
+from adafruit_httpserver import Server, MIMETypes, Response, NO_REQUEST
 
 from libSensors import SensorDevices, overclock
 
@@ -77,15 +80,75 @@ class Conf:
             self.sensor1_correct_temp = "False"
             print(f"Warning: Invalid settings.toml. Using default.")
 
+        try:
+            self.sonar_hysteresis = float(os.getenv("sonar_hysteresis"))
+            self.sonar_fast_interval = float(os.getenv("sonar_fast_interval"))
+            self.sonar_slow_interval = float(os.getenv("sonar_slow_interval"))
+        except (TypeError, ValueError):
+            self.sonar_hysteresis = 2.0
+            self.sonar_fast_interval = 0.25
+            self.sonar_slow_interval = 5.0
+            print("Warning: Invalid sonar sampling settings in settings.toml. Using default.")
+
+        try:
+            self.env_sample_interval = float(os.getenv("env_sample_interval"))
+        except (TypeError, ValueError):
+            self.env_sample_interval = 10.0
+            print("Warning: Invalid env_sample_interval in settings.toml. Using default.")
+
+        # Push mode: send readings to the hub at hub_ip (empty: hub polls us),
+        # as UDP telemetry or as HTTP POSTs to /api/ingest
+        self.hub_ip = os.getenv("hub_ip") or ""
+        self.push_protocol = os.getenv("push_protocol") or "udp"
+        try:
+            self.push_interval = float(os.getenv("push_interval"))
+            self.telemetry_port = int(os.getenv("telemetry_port"))
+        except (TypeError, ValueError):
+            self.push_interval = 10.0
+            self.telemetry_port = 5005
+            print("Warning: Invalid push settings in settings.toml. Using default.")
+
+        # Discovery: broadcast where the hub can find us every announce_interval
+        try:
+            self.announce_interval = int(os.getenv("announce_interval"))
+        except (TypeError, ValueError):
+            self.announce_interval = 60
+            print("Warning: Invalid announce_interval in settings.toml. Using default.")
+
+        # Reboot only when WiFi stays down this long; shorter outages reconnect in place
+        try:
+            self.wifi_reboot_after = float(os.getenv("wifi_reboot_after"))
+        except (TypeError, ValueError):
+            self.wifi_reboot_after = 300.0
+            print("Warning: Invalid wifi_reboot_after in settings.toml. Using default.")
+
 ############################
 # Server
 ############################
 class GarageServer:
-    def __init__(self, sensors):
+    def __init__(self, conf, sensors):
 
+        self.conf = conf
         self.sensors = sensors
         self.server = None
+        self.pusher = None
+        self.telemetry = None
         self.ip = "0.0.0.0"
+        self.loop = LoopScheduler()
+
+        # Pre-encoded /api/status body, rebuilt only when a sample changes it
+        self.snapshot = None
+        self.snapshot_time = 0.0
+        self.snapshot_state = None
+        self.cache_control = "max-age=%d" % int(sensors.envSampler.interval)
+        self.device_location = os.getenv("location") or ""
+
+        self.link = WifiReconnect(os.getenv('CIRCUITPY_WIFI_SSID'),
+                                  os.getenv('CIRCUITPY_WIFI_PASSWORD'),
+                                  conf.wifi_reboot_after)
+        self.link.on_down = self.network_down
+        self.link.on_up = self.network_up
+        self.link.on_give_up = self.reboot
 
         try:
             self.connect_wifi()
@@ -98,11 +161,29 @@ class GarageServer:
         except Exception as e:
             print(f"Unexpected critical error: {e}")
             self.fail_reboot()
-            
+
+    # WiFi lost: close the sockets bound to the old link; samplers and
+    # calibration are kept
+    def network_down(self):
         try:
-            self.device_location = os.getenv("location")
-        except:
-            self.device_location = self.ip
+            self.server.stop()
+        except OSError:
+            pass
+        if self.telemetry is not None:
+            try:
+                self.telemetry.sock.close()
+            except OSError:
+                pass
+            self.telemetry = None
+        if self.pusher is not None and self.pusher.sock is not None:
+            self.pusher.close()
+        self.pusher = None
+
+    # WiFi back: new socket pool, server and push sockets
+    def network_up(self):
+        self.ip = str(wifi.radio.ipv4_address)
+        self.setup_server()
+        print("\nDevice IP:", self.ip, "\nListening...")
 
     def fail_reboot(self):
         print("Rebooting in 5 seconds due to error...")
@@ -115,22 +196,24 @@ class GarageServer:
         if ssid is None or password is None:
             raise RuntimeError("WiFi credentials not found.")
 
+        # connect() returns once the link is up or raises, so there is no
+        # settling delay; failed attempts back off 1, 2, 4, 8 s
         MAX_WIFI_ATTEMPTS = 5
         attempt_count = 0
-        time.sleep(5)
+        if not wifi.radio.enabled:
+            wifi.radio.enabled = True
         while not wifi.radio.connected:
             if attempt_count >= MAX_WIFI_ATTEMPTS:
                 raise RuntimeError("Failed to connect to WiFi after multiple attempts.")
             print(f"\nConnecting to WiFi (attempt {attempt_count + 1}/{MAX_WIFI_ATTEMPTS})...")
             try:
                 wifi.radio.connect(ssid, password)
-                time.sleep(2)
             except ConnectionError as e:
                 print(f"WiFi Connection Error: {e}")
-                time.sleep(5)
+                time.sleep(1 << attempt_count)
             except Exception as e:
                 print(f"WiFi other connect error: {e}")
-                time.sleep(3)
+                time.sleep(1 << attempt_count)
             attempt_count += 1
 
         if wifi.radio.connected:
@@ -142,41 +225,56 @@ class GarageServer:
     def setup_server(self):
         pool = socketpool.SocketPool(wifi.radio)
         self.server = Server(pool, debug=False)
+        # Readings go over UDP only when pushing with push_protocol = "udp";
+        # the socket also answers discovery probes from the hub.
+        udp_host = self.conf.hub_ip if self.conf.push_protocol == "udp" else ""
+        try:
+            self.telemetry = TelemetrySender(pool, udp_host, self.conf.telemetry_port,
+                                             self.conf.push_interval, self.conf.announce_interval,
+                                             self.device_location)
+        except OSError as e:
+            print(f"UDP telemetry and discovery disabled: {e}")
+        if self.conf.hub_ip and not udp_host:
+            self.pusher = HubPusher(pool, self.conf.hub_ip, self.conf.push_interval)
 
         # --- Routes ---
         @self.server.route("/api/status")
         def api_status(request):
-            state = self.sensors.checkStatusSonar()
-            #label = self.sensors.setLabel(state)
-            #temperature = self.sensors.getTemperature()
-            envData = self.sensors.getEnvData(self.sensors.envSensor1, self.sensors.envSensor1_name, self.sensors.sensor1_correct_temp)
-
-            data_dict = {
-                "state": state,
-                "temperature": envData['temperature'],
-                "RH": envData['RH'],
-                "pressure": envData['pressure'],
-                "HI": envData['HI'],
-                "IAQ": envData['IAQ'],
-                "TVOC": envData['TVOC'],
-                "eCO2": envData['eCO2'],
-                "type": envData['type'],
-                "libSensors_version": self.sensors.sensDev.version,
-                "location": self.device_location,
+            if self.snapshot is None:
+                self.update_snapshot()
+            headers = {
+                "Content-Type": "application/json",
+                "Cache-Control": self.cache_control,
+                "Age": str(int(time.monotonic() - self.snapshot_time)),
             }
-            json_content = json.dumps(data_dict)
-
-            print(json_content)
-
-            headers = {"Content-Type": "application/json"}
-
-            # Return the response using the compatible Response constructor
-            return Response(request, json_content, headers=headers)
+            return Response(request, self.snapshot, headers=headers)
 
 
         # Start the server
         self.server.start(host=self.ip, port=80)
 
+    # Encodes the latest door state and env sample once, for every request until the next change
+    def update_snapshot(self):
+        state = self.sensors.doorState()
+        envData = self.sensors.envSampler.latest()
+        data_dict = {
+            "state": state,
+            "temperature": envData['temperature'],
+            "RH": envData['RH'],
+            "pressure": envData['pressure'],
+            "HI": envData['HI'],
+            "IAQ": envData['IAQ'],
+            "TVOC": envData['TVOC'],
+            "eCO2": envData['eCO2'],
+            "type": envData['type'],
+            "libSensors_version": self.sensors.sensDev.version,
+            "location": self.device_location,
+        }
+        json_content = json.dumps(data_dict)
+        self.snapshot = json_content.encode("utf-8")
+        self.snapshot_time = time.monotonic()
+        self.snapshot_state = state
+
     def _serve_static_file(self, request, filepath, content_type="text/html"):
         """Manually reads a file and returns an HTTP response with a customizable content type."""
 
@@ -206,12 +304,12 @@ class GarageServer:
 
     def serve_forever(self):
         while True:
-            if not wifi.radio.connected:
-                print("WiFi connection lost. Rebooting...")
-                self.reboot()
+            # While WiFi is down the sensors keep sampling
+            online = self.link.service()
 
             try:
-                self.server.poll()
+                if online and self.server.poll() != NO_REQUEST:
+                    self.loop.busy()
             except (BrokenPipeError, OSError) as e:
                 if isinstance(e, OSError) and e.args[0] not in (32, 104):
                     print(f"Unexpected OSError in server poll: {e}")
@@ -220,13 +318,379 @@ class GarageServer:
             except Exception as e:
                 print(f"Unexpected critical error in server poll: {e}")
 
-            time.sleep(0.01)
+            try:
+                if self.sensors.sonarSampler:
+                    self.sensors.sonarSampler.service()
+            except Exception as e:
+                print(f"Error sampling sonar: {e}")
+
+            try:
+                door_changed = self.sensors.doorState() != self.snapshot_state
+                if self.sensors.envSampler.service() or door_changed:
+                    self.update_snapshot()
+            except Exception as e:
+                door_changed = False
+                print(f"Error sampling sensors: {e}")
+
+            try:
+                if self.telemetry:
+                    self.telemetry.service(self.sensors.envSampler.last, self.snapshot_state, door_changed)
+                if self.pusher and self.snapshot is not None:
+                    self.pusher.service(self.snapshot, door_changed)
+            except Exception as e:
+                print(f"Error pushing to hub: {e}")
+
+            self.loop.wake(self.sensors.envSampler.next_sample)
+            self.loop.wake(self.link.next_attempt)
+            if self.sensors.sonarSampler:
+                self.loop.wake(self.sensors.sonarSampler.next_sample)
+            if self.telemetry:
+                self.loop.wake(self.telemetry.next_announce)
+                if self.telemetry.host:
+                    self.loop.wake(self.telemetry.next_send)
+            if self.pusher and self.pusher.sock is None:
+                self.loop.wake(self.pusher.next_push)
+            self.loop.sleep()
 
     def reboot(self):
         time.sleep(2)
         microcontroller.reset()
 
 
+############################
+# Main loop scheduler
+############################
+# Paces serve_forever instead of a fixed sleep. After a pass that served a
+# request the loop runs again right away; idle passes sleep min_sleep,
+# doubling up to max_sleep, but never past the earliest timer deadline
+# (next sample, push or announcement) registered with wake().
+class LoopScheduler:
+    def __init__(self, min_sleep=0.001, max_sleep=0.05):
+        self.min_sleep = min_sleep
+        self.max_sleep = max_sleep
+        self.idle_sleep = 0.0
+        self.deadline = None
+        self.active = False
+
+        self.passes = 0
+        self.busy_passes = 0
+        self.slept = 0.0
+        self.started = time.monotonic()
+
+    # Something was served this pass: poll again without sleeping
+    def busy(self):
+        self.active = True
+
+    # Timer deadline (time.monotonic()) for this pass; None for no timer
+    def wake(self, deadline):
+        if deadline is not None and (self.deadline is None or deadline < self.deadline):
+            self.deadline = deadline
+
+    def sleep(self):
+        self.passes += 1
+        if self.active:
+            self.active = False
+            self.busy_passes += 1
+            self.idle_sleep = 0.0
+        delay = self.idle_sleep
+        if self.deadline is not None:
+            delay = min(delay, self.deadline - time.monotonic())
+            self.deadline = None
+        if delay > 0:
+            time.sleep(delay)
+            self.slept += delay
+        self.idle_sleep = min(max(self.idle_sleep * 2, self.min_sleep), self.max_sleep)
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        return {"passes": self.passes,
+                "busy_passes": self.busy_passes,
+                "idle_sleep": self.idle_sleep,
+                "sleep_ratio": round(self.slept / elapsed, 3) if elapsed else 0}
+
+############################
+# WiFi reconnect
+############################
+# Brings the link back in place when WiFi drops, instead of rebooting:
+# reconnect attempts back off from min_backoff to max_backoff seconds and,
+# once connected, on_up() rebuilds the sockets while all in-memory state
+# stays. Rebooting is the last resort, after reboot_after seconds down.
+class WifiReconnect:
+    def __init__(self, ssid, password, reboot_after, min_backoff=1.0, max_backoff=30.0):
+        self.ssid = ssid
+        self.password = password
+        self.reboot_after = reboot_after
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.backoff = min_backoff
+        self.down_since = None
+        self.next_attempt = None
+
+        # Callbacks set by the owner
+        self.on_down = None     # link lost: drop the sockets
+        self.on_up = None       # link back: rebuild the sockets
+        self.on_give_up = None  # down for reboot_after seconds
+
+        self.outages = 0
+        self.attempts = 0
+        self.last_outage = None
+
+    # True while the link is up. While it is down, makes one connection
+    # attempt when the backoff expires, unless hold is set (connect() blocks).
+    def service(self, hold=False):
+        now = time.monotonic()
+        if self.down_since is None:
+            if wifi.radio.connected:
+                return True
+            print("WiFi connection lost. Reconnecting...")
+            self.down_since = now
+            self.next_attempt = now
+            self.backoff = self.min_backoff
+            self.outages += 1
+            self.on_down()
+
+        if now - self.down_since > self.reboot_after:
+            print(f"WiFi down for more than {self.reboot_after:.0f} s. Rebooting...")
+            self.on_give_up()
+        if hold or now < self.next_attempt:
+            return False
+
+        self.attempts += 1
+        try:
+            if not wifi.radio.connected:
+                wifi.radio.connect(self.ssid, self.password)
+            self.on_up()
+        except Exception as e:
+            print(f"WiFi reconnect failed, retrying in {self.backoff:.0f} s: {e}")
+            # Drop whatever on_up() set up before failing
+            self.on_down()
+            self.next_attempt = time.monotonic() + self.backoff
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            return False
+
+        self.last_outage = time.monotonic() - self.down_since
+        self.down_since = None
+        self.next_attempt = None
+        print(f"WiFi reconnected after {self.last_outage:.1f} s")
+        return True
+
+    def stats(self):
+        return {"connected": self.down_since is None,
+                "down_s": round(time.monotonic() - self.down_since, 1) if self.down_since is not None else 0,
+                "outages": self.outages,
+                "attempts": self.attempts,
+                "last_outage_s": round(self.last_outage, 1) if self.last_outage is not None else None}
+
+############################
+# UDP telemetry
+############################
+# Datagram header: magic, protocol version, message type, device id,
+# sequence number, sender uptime (ms). Must match hub/code.py
+TELEMETRY_MAGIC = b"GO"
+TELEMETRY_VERSION = 1
+TELEMETRY_HEADER = "<2sBBIHL"
+MSG_READING = 1
+MSG_ANNOUNCE = 2
+MSG_PROBE = 3
+
+# Reading: scaled TELEMETRY_FIELDS, door index (-1: N/A), reading type
+TELEMETRY_READING = "<7hbB"
+TELEMETRY_FIELDS = ('temperature', 'RH', 'pressure', 'IAQ', 'TVOC', 'eCO2', 'HI')
+TELEMETRY_SCALE = (10, 10, 1, 1, 1, 1, 10)
+TELEMETRY_MISSING = -32768
+READING_TYPES = ("sensor", "CPU adj", "CPU raw", "CPU adj.")
+DOOR_STATES = ("CLOSED", "OPEN", "MOVING")
+
+# Announce: HTTP port, announce interval (s), then the location in UTF-8.
+# Probe: header only.
+TELEMETRY_ANNOUNCE = "<HH"
+ANNOUNCE_LOCATION_MAX = 32
+
+# Sends the latest reading to the hub at host (if any) as one datagram every
+# interval and right away when the door state changes. Fire and forget: the
+# hub counts gaps in the sequence numbers.
+# For discovery, announces this remote by broadcast every announce_interval
+# and answers the hub's probes on the same port.
+class TelemetrySender:
+    def __init__(self, pool, host, port, interval, announce_interval, location):
+        self.sock = pool.socket(pool.AF_INET, pool.SOCK_DGRAM)
+        self.sock.bind(("0.0.0.0", port))
+        self.sock.setblocking(False)
+        try:
+            self.sock.setsockopt(pool.SOL_SOCKET, pool.SO_BROADCAST, 1)
+        except (AttributeError, OSError):
+            # Not exposed by every port; lwIP sends broadcasts without it
+            pass
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.announce_interval = announce_interval
+        self.broadcast = broadcastAddress()
+        self.device_id = int.from_bytes(bytes(wifi.radio.mac_address)[2:], "big")
+        self.seq = 0
+        self.header_size = struct.calcsize(TELEMETRY_HEADER)
+
+        location = location[:ANNOUNCE_LOCATION_MAX]
+        while len(location.encode()) > ANNOUNCE_LOCATION_MAX:
+            location = location[:-1]
+        self.location = location.encode()
+
+        self.buffer = bytearray(self.header_size + struct.calcsize(TELEMETRY_ANNOUNCE) + ANNOUNCE_LOCATION_MAX)
+        self.rx = bytearray(64)
+        self.next_send = time.monotonic()
+        self.next_announce = self.next_send
+        self.failures = 0
+
+    def send(self, msg_type, size, host):
+        struct.pack_into(TELEMETRY_HEADER, self.buffer, 0, TELEMETRY_MAGIC, TELEMETRY_VERSION,
+                         msg_type, self.device_id, self.seq,
+                         (time.monotonic_ns() // 1_000_000) & 0xFFFFFFFF)
+        self.seq = (self.seq + 1) & 0xFFFF
+        try:
+            self.sock.sendto(memoryview(self.buffer)[:self.header_size + size], (host, self.port))
+            self.failures = 0
+        except OSError as e:
+            self.failures += 1
+            if self.failures == 1 or self.failures % 10 == 0:
+                print(f"Telemetry to {host} failed ({self.failures}x): {e}")
+
+    def sendReading(self, data, state):
+        values = []
+        for c in range(len(TELEMETRY_FIELDS)):
+            try:
+                v = round(float(data[TELEMETRY_FIELDS[c]]) * TELEMETRY_SCALE[c])
+                # int16 on the wire: out of range is sent as missing, not wrapped
+                if v < -32767 or v > 32767:
+                    v = TELEMETRY_MISSING
+            except (KeyError, ValueError, TypeError, OverflowError):
+                v = TELEMETRY_MISSING
+            values.append(v)
+        door = DOOR_STATES.index(state) if state in DOOR_STATES else -1
+        kind = READING_TYPES.index(data['type']) if data.get('type') in READING_TYPES else 255
+        struct.pack_into(TELEMETRY_READING, self.buffer, self.header_size, *values, door, kind)
+        self.send(MSG_READING, struct.calcsize(TELEMETRY_READING), self.host)
+
+    def sendAnnounce(self, host):
+        size = struct.calcsize(TELEMETRY_ANNOUNCE)
+        struct.pack_into(TELEMETRY_ANNOUNCE, self.buffer, self.header_size, 80, self.announce_interval)
+        self.buffer[self.header_size + size:self.header_size + size + len(self.location)] = self.location
+        self.send(MSG_ANNOUNCE, size + len(self.location), host)
+
+    # Answers probes from the hub; other datagrams (announcements of the
+    # other remotes) are ignored.
+    def receive(self, max_per_call=4):
+        for _ in range(max_per_call):
+            try:
+                n, addr = self.sock.recvfrom_into(self.rx)
+            except OSError as e:
+                if e.errno in WAIT_ERRNOS:
+                    return
+                raise
+            if n < self.header_size:
+                continue
+            magic, ver, msg_type = struct.unpack_from("<2sBB", self.rx)
+            if magic == TELEMETRY_MAGIC and ver == TELEMETRY_VERSION and msg_type == MSG_PROBE:
+                self.sendAnnounce(addr[0])
+
+    # Called from the main loop
+    def service(self, data, state, door_changed):
+        now = time.monotonic()
+        if self.host and data is not None and (door_changed or now >= self.next_send):
+            self.next_send = now + self.interval
+            self.sendReading(data, state)
+        if now >= self.next_announce:
+            self.next_announce = now + self.announce_interval
+            self.sendAnnounce(self.broadcast)
+        self.receive()
+
+############################
+# Push to hub
+############################
+# Socket errors meaning "not ready yet" on a non-blocking socket
+WAIT_ERRNOS = (errno.EAGAIN, errno.EINPROGRESS, errno.EALREADY, errno.ENOTCONN)
+
+# POSTs the status snapshot to the hub's /api/ingest every interval and
+# right away when the door state changes, over a non-blocking socket.
+class HubPusher:
+    def __init__(self, pool, host, interval, timeout=3.0, port=80):
+        self.pool = pool
+        self.host = host
+        self.interval = interval
+        self.timeout = timeout
+        self.port = port
+
+        self.sock = None
+        self.request = None
+        self.sent = False
+        self.deadline = 0.0
+        self.buffer = bytearray(64)
+        self.length = 0
+        self.pending = False
+        self.next_push = time.monotonic()
+        self.failures = 0
+
+    def start(self, body):
+        sock = self.pool.socket(self.pool.AF_INET, self.pool.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            sock.connect((self.host, self.port))
+        except OSError as e:
+            if e.errno not in WAIT_ERRNOS:
+                sock.close()
+                self.failed(e)
+                return
+        self.sock = sock
+        self.request = b"POST /api/ingest HTTP/1.1\r\nHost: " + self.host.encode() + \
+            b"\r\nContent-Type: application/json\r\nContent-Length: " + str(len(body)).encode() + \
+            b"\r\nConnection: close\r\n\r\n" + body
+        self.sent = False
+        self.length = 0
+        self.deadline = time.monotonic() + self.timeout
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        self.sock = None
+        self.request = None
+
+    def failed(self, error):
+        self.failures += 1
+        if self.failures == 1 or self.failures % 10 == 0:
+            print(f"Push to hub {self.host} failed ({self.failures}x): {error}")
+
+    # Called from the main loop with the current snapshot
+    def service(self, body, door_changed):
+        now = time.monotonic()
+        if door_changed or now >= self.next_push:
+            self.pending = True
+        if self.sock is None:
+            if self.pending:
+                self.pending = False
+                self.next_push = now + self.interval
+                self.start(body)
+            return
+
+        try:
+            if not self.sent:
+                self.sock.send(self.request)
+                self.sent = True
+            n = self.sock.recv_into(memoryview(self.buffer)[self.length:])
+            self.length += n
+            if n == 0 or self.length == len(self.buffer):
+                status = bytes(self.buffer[9:12])
+                self.close()
+                if status == b"200":
+                    self.failures = 0
+                else:
+                    self.failed("HTTP status " + status.decode())
+        except OSError as e:
+            if e.errno in WAIT_ERRNOS and now < self.deadline:
+                return
+            self.close()
+            self.failed("Timeout" if e.errno in WAIT_ERRNOS else e)
+
 ############################
 # Sensors
 ############################
@@ -244,6 +708,13 @@ class Sensors:
 
         self.trigger_distance = conf.trigger_distance
 
+        self.sonarSampler = None
+        if self.sonar:
+            self.sonarSampler = SonarSampler(self.sonar, conf.trigger_distance,
+                                             conf.sonar_hysteresis,
+                                             conf.sonar_fast_interval,
+                                             conf.sonar_slow_interval)
+
         # Sensor initialization
         self.envSensor1 = None
         self.envSensor1_name = conf.sensor1_name
@@ -263,6 +734,8 @@ class Sensors:
 
         self.numTimes = 1
 
+        self.envSampler = EnvSampler(self, conf.env_sample_interval)
+
     def getEnvData(self, envSensor, envSensor_name, correct_temp):
         t_cpu = microcontroller.cpu.temperature
         if not envSensor:
@@ -293,11 +766,9 @@ class Sensors:
             self.avDeltaT = (self.avDeltaT * self.numTimes + delta_t)/(self.numTimes+1)
             self.numTimes += 1
             print(f"Av. CPU/MCP T diff: {self.avDeltaT} {self.numTimes}")
-            time.sleep(0.5)
             return envSensorData
         except:
             print(f"{envSensor_name} not available. Av CPU/MCP T diff: {self.avDeltaT}")
-            time.sleep(0.5)
             return {'temperature': f"{round(t_cpu-self.avDeltaT, 1)}",
                     'RH': '--',
                     'pressure': '--',
@@ -307,27 +778,134 @@ class Sensors:
                     'HI': '--',
                     'type': 'CPU adj'}
 
-    def checkStatusSonar(self):
-        if not self.sonar:
-            print("Sonar not initialized.")
+    # Filtered door state; no side effects, it is read on every loop pass
+    def doorState(self):
+        if self.sonarSampler is None:
             return "N/A"
-        nt = 0
-        while nt < 2:
-            try:
-                dist = self.sonar.distance
-                print("Distance: "+str(dist))
-                if dist < self.trigger_distance:
-                    return "OPEN"
-                else:
-                    return "CLOSED"
-                time.sleep(0.5)
-                return st
-            except RuntimeError as err:
-                print(f" Check Sonar Status: Retrying! Error: {err}")
-                nt += 1
-                time.sleep(0.5)
-        print(" Sonar status not available")
-        return "N/A"
+        return self.sonarSampler.state
+
+############################
+# Environmental sampler
+############################
+# Reads the env sensor on a fixed interval from the main loop, so requests
+# never wait on the I2C/SPI read.
+class EnvSampler:
+    def __init__(self, sensors, interval):
+        self.sensors = sensors
+        self.interval = interval
+        self.last = None
+        self.last_time = 0.0
+        self.next_sample = time.monotonic()
+
+    def sample(self):
+        s = self.sensors
+        self.last = s.getEnvData(s.envSensor1, s.envSensor1_name, s.sensor1_correct_temp)
+        self.last_time = time.monotonic()
+
+    # Called from the main loop; returns True when a new sample was taken
+    def service(self):
+        now = time.monotonic()
+        if now >= self.next_sample:
+            self.next_sample = now + self.interval
+            self.sample()
+            return True
+        return False
+
+    # Latest sample, read synchronously only before the first scheduled one
+    def latest(self):
+        if self.last is None:
+            self.sample()
+        return self.last
+
+############################
+# Sonar sampler
+############################
+class SonarSampler:
+    def __init__(self, sonar, trigger_distance, hysteresis, fast_interval, slow_interval, window=5):
+        self.sonar = sonar
+        self.trigger_distance = trigger_distance
+        self.hysteresis = hysteresis
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.window = window
+
+        self.readings = array('f', [0.0] * window)
+        self.index = 0
+        self.count = 0
+        self.failures = 0
+        self.stable = 0
+
+        self.distance = None
+        self.state = "N/A"
+        self.interval = fast_interval
+        self.next_sample = time.monotonic()
+
+    def median(self):
+        values = sorted(self.readings[:self.count])
+        return values[self.count // 2]
+
+    # Door state from the filtered distance, holding the previous
+    # state while inside the hysteresis band around trigger_distance.
+    def classify(self, dist):
+        if dist < self.trigger_distance - self.hysteresis:
+            return "OPEN"
+        if dist > self.trigger_distance + self.hysteresis:
+            return "CLOSED"
+        if self.state in ("OPEN", "CLOSED"):
+            return self.state
+        return "OPEN" if dist < self.trigger_distance else "CLOSED"
+
+    def sample(self):
+        try:
+            dist = self.sonar.distance
+        except RuntimeError as err:
+            self.failures += 1
+            if self.failures >= self.window:
+                print(f" Sonar status not available: {err}")
+                self.state = "N/A"
+                # Start the window over: the next median is of fresh readings only
+                self.index = 0
+                self.count = 0
+                self.interval = self.slow_interval
+            return
+
+        self.failures = 0
+        # A raw reading away from the filtered distance means the door may
+        # be moving: sample fast right away, before the median follows
+        if self.distance is not None and abs(dist - self.distance) > self.hysteresis:
+            self.stable = 0
+            self.interval = self.fast_interval
+
+        self.readings[self.index] = dist
+        self.index = (self.index + 1) % self.window
+        self.count = min(self.count + 1, self.window)
+
+        previous = self.distance
+        self.distance = self.median()
+
+        if previous is not None and abs(self.distance - previous) > self.hysteresis:
+            # Distance is changing: door is moving, sample fast
+            if self.state != "MOVING":
+                print(f"Door moving. Distance: {self.distance}")
+            self.state = "MOVING"
+            self.stable = 0
+            self.interval = self.fast_interval
+            return
+
+        self.stable += 1
+        state = self.classify(self.distance)
+        if state != self.state:
+            print(f"Door {state}. Distance: {self.distance}")
+            self.state = state
+        if self.stable >= self.window:
+            self.interval = self.slow_interval
+
+    # Called from the main loop
+    def service(self):
+        now = time.monotonic()
+        if now >= self.next_sample:
+            self.sample()
+            self.next_sample = time.monotonic() + self.interval
 
 ############################
 # Utilities
@@ -344,13 +922,22 @@ def stringToArray(string):
         print("Warning: Initial string-array not found in settings.toml")
         return []
 
+# Directed broadcast address of the WiFi subnet (e.g. 192.168.1.255)
+def broadcastAddress():
+    try:
+        ip = str(wifi.radio.ipv4_address).split('.')
+        mask = str(wifi.radio.ipv4_subnet).split('.')
+        return '.'.join(str(int(ip[i]) | (~int(mask[i]) & 0xFF)) for i in range(4))
+    except (AttributeError, IndexError, ValueError):
+        return "255.255.255.255"
+
 ############################
 # Main
 ############################
 def main():
     conf = Conf()
     sensors = Sensors(conf)
-    server = GarageServer(sensors)
+    server = GarageServer(conf, sensors)
     server.serve_forever()
 
 main()
@@ -43,7 +43,8 @@ BOOLEAN_CHOICES = ["True", "False"]
 DEFAULT_SETTINGS = {
     'wifi': {
         'CIRCUITPY_WIFI_SSID': 'ssid_name',
-        'CIRCUITPY_WIFI_PASSWORD': 'password'
+        'CIRCUITPY_WIFI_PASSWORD': 'password',
+        'wifi_reboot_after': '300'
     },
     'web_api': {
         'CIRCUITPY_WEB_INSTANCE_NAME': 'LabMonitor',
@@ -59,12 +60,36 @@ DEFAULT_SETTINGS = {
     'sonar': {
         'trigger_distance': '20',
         'sonar_location': 'remote1',
+        'sonar_hysteresis': '2',
+        'sonar_fast_interval': '0.25',
+        'sonar_slow_interval': '5',
     },
     'sensors': {
         'sensor1_name': 'AHT21',
         'sensor1_pins': '15,14',
         'sensor1_correct_temp': False,
-        'remote_sensor_ip': '0.0.0.0'
+        'env_sample_interval': '10',
+        'history_size': '720',
+        'history_decimation': '6',
+        'history_log': False,
+        'history_log_segment_size': '4096',
+        'history_log_segments': '4',
+        'history_log_batch': '30',
+        'ntp_resync_interval': '3600',
+        'remote_sensor_ip': '0.0.0.0',
+        'remote_max_age': '30',
+        'remote_refresh_interval': '20',
+        'remote_timeout': '3',
+        'remote_max_backoff': '300',
+        'max_remotes': '6',
+        'discovery_interval': '300',
+        'ws_max_clients': '3',
+        'http_slots': '4',
+        'http_timeout': '5',
+        'telemetry_port': '5005',
+        'static_cache_budget': '16384',
+        'static_cache_max_file': '8192',
+        'static_cache_min_free': '40000',
     },
     'database': {
         'station': 'kbos',
@@ -72,6 +97,15 @@ DEFAULT_SETTINGS = {
         'country': 'US',
         'ow_api_key': 'YOUR_API_KEY',
     },
+    'notifications': {
+        'mail_url': '',
+        'mail_api_key': '',
+        'mail_recipient': '',
+        'mail_outbox_size': '10',
+        'mail_batch_delay': '30',
+        'mail_timeout': '5',
+        'door_open_alert': '15',
+    },
 }
 
 class ConfigApp(tk.Tk):
@@ -34,7 +34,8 @@ BOOLEAN_CHOICES = ["True", "False"]
 DEFAULT_SETTINGS = {
     'wifi': {
         'CIRCUITPY_WIFI_SSID': 'ssid_name',
-        'CIRCUITPY_WIFI_PASSWORD': 'password'
+        'CIRCUITPY_WIFI_PASSWORD': 'password',
+        'wifi_reboot_after': '300'
     },
     'web_api': {
         'CIRCUITPY_WEB_INSTANCE_NAME': 'GarageOpenerSensor',
@@ -48,12 +49,23 @@ DEFAULT_SETTINGS = {
         'overclock': False
     },
     'sonar': {
-        'trigger_distance': '20'
+        'trigger_distance': '20',
+        'sonar_hysteresis': '2',
+        'sonar_fast_interval': '0.25',
+        'sonar_slow_interval': '5',
     },
     'sensors': {
         'sensor1_name': 'AHT21',
         'sensor1_pins': '15,14',
         'sensor1_correct_temp': False,
+        'env_sample_interval': '10',
+    },
+    'hub': {
+        'hub_ip': '',
+        'push_interval': '10',
+        'push_protocol': 'udp',
+        'telemetry_port': '5005',
+        'announce_interval': '60',
     },
 }
 
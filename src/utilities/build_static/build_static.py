@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# **********************************************
+# * PicoGarageOpener - Static assets builder
+# * Host side (CPython)
+# * v2026.10.18.1
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+'''
+Prepares the hub dashboard for upload: local scripts and stylesheets
+referenced by the pages are inlined, the result is minified and written
+gzipped next to the original (index.html -> index.html.gz). The hub
+serves the .gz to browsers sending "Accept-Encoding: gzip" and the
+original to everything else, so keep editing the originals and re-run:
+
+    python3 build_static.py                 # src/hub/static
+    python3 build_static.py path/to/static  # any other folder
+
+Every .gz records the CRC32 of the source it was built from; the hub
+ignores a .gz whose source has changed since, so a forgotten rebuild
+costs bandwidth, not correctness.
+'''
+
+version = "2026.10.18.1"
+
+import os
+import re
+import sys
+import gzip
+import zlib
+import argparse
+
+DEFAULT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "hub", "static")
+COMPRESS_EXT = (".html", ".js", ".css", ".json", ".ico", ".svg")
+MIN_SAVING = 0.1
+
+SCRIPT_SRC = re.compile(r'<script([^>]*)\ssrc="\.?/?([^":]+\.js)"([^>]*)>\s*</script>', re.I)
+STYLE_LINK = re.compile(r'<link[^>]*\shref="\.?/?([^":]+\.css)"[^>]*>', re.I)
+BLOCK = re.compile(r'(<script[^>]*>)(.*?)(</script>)|(<style[^>]*>)(.*?)(</style>)', re.I | re.S)
+
+def inline_assets(html, folder):
+    """Replaces references to local .js/.css files with their contents."""
+    def script(m):
+        with open(os.path.join(folder, m.group(2)), encoding="utf-8") as f:
+            return "<script" + m.group(1) + m.group(3) + ">\n" + f.read() + "\n</script>"
+    def style(m):
+        with open(os.path.join(folder, m.group(1)), encoding="utf-8") as f:
+            return "<style>\n" + f.read() + "\n</style>"
+    html = SCRIPT_SRC.sub(script, html)
+    return STYLE_LINK.sub(style, html)
+
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};:,>])\s*", r"\1", css).strip()
+
+def minify_js(js):
+    """Conservative: drops whole-line comments, indentation and blank lines.
+    Line breaks are kept so automatic semicolon insertion still applies."""
+    js = re.sub(r"^\s*/\*.*?\*/\s*$", "", js, flags=re.S | re.M)
+    lines = []
+    for line in js.splitlines():
+        line = line.strip()
+        if line and not line.startswith("//"):
+            lines.append(line)
+    return "\n".join(lines)
+
+def minify_html(html):
+    out = []
+    pos = 0
+    for m in BLOCK.finditer(html):
+        out.append(minify_markup(html[pos:m.start()]))
+        if m.group(1):
+            out.append(m.group(1) + minify_js(m.group(2)) + m.group(3))
+        else:
+            out.append(m.group(4) + minify_css(m.group(5)) + m.group(6))
+        pos = m.end()
+    out.append(minify_markup(html[pos:]))
+    return "".join(out)
+
+def minify_markup(html):
+    html = re.sub(r"<!--.*?-->", "", html, flags=re.S)
+    return re.sub(r"\s*\n\s*", "\n", html).strip()
+
+def build(filename, folder):
+    """Returns the (inlined, minified) bytes to compress for a file."""
+    with open(filename, "rb") as f:
+        raw = f.read()
+    if filename.endswith(".html"):
+        return minify_html(inline_assets(raw.decode("utf-8"), folder)).encode("utf-8")
+    if filename.endswith(".css"):
+        return minify_css(raw.decode("utf-8")).encode("utf-8")
+    if filename.endswith(".js"):
+        return minify_js(raw.decode("utf-8")).encode("utf-8")
+    return raw
+
+def source_crc(filename):
+    """Must match StaticAssets.hashFile in src/hub/code.py"""
+    with open(filename, "rb") as f:
+        return "%08x" % (zlib.crc32(f.read()) & 0xFFFFFFFF)
+
+def write_gzip(filename, data):
+    # The gzip FNAME field carries "<name>@<crc of source>", mtime is zeroed
+    # so unchanged sources give identical outputs.
+    name = os.path.basename(filename) + "@" + source_crc(filename)
+    with open(filename + ".gz", "wb") as raw:
+        with gzip.GzipFile(filename=name, mode="wb", fileobj=raw, compresslevel=9, mtime=0) as f:
+            f.write(data)
+    return os.path.getsize(filename + ".gz")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build gzipped hub static assets v."+version)
+    parser.add_argument("folder", nargs="?", default=DEFAULT_FOLDER, help="static folder (default: src/hub/static)")
+    args = parser.parse_args()
+    folder = os.path.normpath(args.folder)
+
+    total_in = total_out = 0
+    for name in sorted(os.listdir(folder)):
+        filename = os.path.join(folder, name)
+        if not name.endswith(COMPRESS_EXT) or not os.path.isfile(filename):
+            continue
+        size = os.path.getsize(filename)
+        gz_size = write_gzip(filename, build(filename, folder))
+        if gz_size > size * (1 - MIN_SAVING):
+            os.remove(filename + ".gz")
+            print(f"{name}: {size} bytes, not worth compressing")
+            continue
+        total_in += size
+        total_out += gz_size
+        print(f"{name}: {size} -> {gz_size} bytes")
+    print(f"Total: {total_in} -> {total_out} bytes")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# **********************************************
+# * PicoGarageOpener - History log decoder
+# * Host side (CPython)
+# * v2026.10.18.1
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+'''
+Decodes the binary history log written by the hub (history_log = "True")
+into NumPy arrays or CSV.
+
+Copy the "history" folder from the CIRCUITPY drive, then:
+
+    python3 decode_history.py history/                 # summary
+    python3 decode_history.py history/ -o history.csv  # CSV export
+
+From Python:
+
+    from decode_history import load_history
+    data = load_history("history/")
+    data["temperature"], data["t"]
+'''
+
+version = "2026.10.18.1"
+
+import os
+import sys
+import csv
+import struct
+import argparse
+import datetime
+
+# Must match HISTORY_LOG_* / HISTORY_RECORD in src/hub/code.py
+HISTORY_LOG_MAGIC = b"GOPH"
+HISTORY_LOG_VERSION = 1
+HISTORY_LOG_HEADER = "<4sBBH"
+HISTORY_RECORD = "<Lhhhhhhb"
+HISTORY_FIELDS = ('temperature', 'RH', 'pressure', 'IAQ', 'TVOC', 'eCO2')
+HISTORY_SCALE = (10, 10, 1, 1, 1, 1)
+HISTORY_MISSING = -32768
+DOOR_STATES = ("CLOSED", "OPEN", "MOVING")
+
+def segment_files(path):
+    """Segment files in log order, from a folder or a list of files."""
+    if os.path.isdir(path):
+        names = sorted(n for n in os.listdir(path) if n.startswith("seg") and n.endswith(".bin"))
+        return [os.path.join(path, n) for n in names]
+    return [path]
+
+def read_segment(filename):
+    """Returns the raw records of one segment as bytes."""
+    header_size = struct.calcsize(HISTORY_LOG_HEADER)
+    record_size = struct.calcsize(HISTORY_RECORD)
+    with open(filename, "rb") as f:
+        header = f.read(header_size)
+        # Truncated before the header was written (power loss on creation)
+        if len(header) < header_size:
+            print(f"Skipping invalid segment {filename}", file=sys.stderr)
+            return b""
+        magic, ver, rec_size, _ = struct.unpack(HISTORY_LOG_HEADER, header)
+        if magic != HISTORY_LOG_MAGIC:
+            raise ValueError(f"{filename}: not a history log segment")
+        if ver != HISTORY_LOG_VERSION or rec_size != record_size:
+            raise ValueError(f"{filename}: unsupported version {ver} (record size {rec_size})")
+        raw = f.read()
+    # Drop a trailing partial record (power loss during a write)
+    return raw[:len(raw) - len(raw) % record_size]
+
+def load_history(path):
+    """Decodes all segments into a dict of NumPy arrays.
+
+    Readings are float arrays with NaN for missing values, "t" is UTC
+    seconds and "door" the index in DOOR_STATES (-1 for N/A).
+    """
+    import numpy as np
+
+    dtype = np.dtype([("t", "<u4")] +
+                     [(field, "<i2") for field in HISTORY_FIELDS] +
+                     [("door", "i1")])
+    raw = b"".join(read_segment(f) for f in segment_files(path))
+    records = np.frombuffer(raw, dtype=dtype)
+
+    data = {"t": records["t"].astype(np.int64), "door": records["door"].copy()}
+    for field, scale in zip(HISTORY_FIELDS, HISTORY_SCALE):
+        values = records[field].astype(np.float64)
+        values[records[field] == HISTORY_MISSING] = np.nan
+        data[field] = values / scale
+    return data
+
+def iter_rows(path):
+    """Decoded rows without NumPy: (datetime, values..., door state)."""
+    record_size = struct.calcsize(HISTORY_RECORD)
+    for filename in segment_files(path):
+        raw = read_segment(filename)
+        for offset in range(0, len(raw), record_size):
+            r = struct.unpack_from(HISTORY_RECORD, raw, offset)
+            values = ["" if v == HISTORY_MISSING else (v if scale == 1 else v / scale)
+                      for v, scale in zip(r[1:-1], HISTORY_SCALE)]
+            door = DOOR_STATES[r[-1]] if r[-1] >= 0 else "N/A"
+            t = datetime.datetime.fromtimestamp(r[0], datetime.timezone.utc)
+            yield [t.isoformat()] + values + [door]
+
+def write_csv(path, out):
+    count = 0
+    with open(out, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["UTC"] + list(HISTORY_FIELDS) + ["door"])
+        for row in iter_rows(path):
+            writer.writerow(row)
+            count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode the PicoGarageOpener history log v."+version)
+    parser.add_argument("path", help="history folder copied from CIRCUITPY, or a single segment file")
+    parser.add_argument("-o", "--csv", help="write decoded records to this CSV file")
+    args = parser.parse_args()
+
+    if args.csv:
+        count = write_csv(args.path, args.csv)
+        print(f"Wrote {count} records to {args.csv}")
+        return
+
+    rows = list(iter_rows(args.path))
+    if not rows:
+        print("No records found.")
+        return
+    print(f"{len(rows)} records from {rows[0][0]} to {rows[-1][0]}")
+    print("UTC, " + ", ".join(HISTORY_FIELDS) + ", door")
+    for row in rows[-10:]:
+        print(", ".join(str(v) for v in row))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+# Stand-in for the HC-SR04 sonar driver: a closed door at ~150 cm with a
+# little noise. Set DISTANCE to simulate the door opening.
+import random
+
+DISTANCE = 150.0
+
+class HCSR04:
+    def __init__(self, trigger_pin, echo_pin, timeout=0.1):
+        self.trigger_pin = trigger_pin
+        self.echo_pin = echo_pin
+
+    @property
+    def distance(self):
+        return DISTANCE + random.uniform(-0.5, 0.5)
+
+    def deinit(self):
+        pass
@@ -0,0 +1,15 @@
+# Stand-in for adafruit_ntp: host clock, no network traffic.
+import time
+
+class NTP:
+    def __init__(self, socketpool, *, server="0.adafruit.pool.ntp.org", port=123,
+                 tz_offset=0, socket_timeout=10, cache_seconds=0):
+        self.tz_offset = tz_offset
+
+    @property
+    def utc_ns(self):
+        return time.time_ns()
+
+    @property
+    def datetime(self):
+        return time.gmtime(time.time() + self.tz_offset * 3600)
@@ -0,0 +1,30 @@
+# Stand-in for the CircuitPython digitalio module. Pin writes are recorded
+# so the harness can tell whether the door relay was pulsed.
+
+class Direction:
+    INPUT = "INPUT"
+    OUTPUT = "OUTPUT"
+
+class Pull:
+    UP = "UP"
+    DOWN = "DOWN"
+
+class DigitalInOut:
+    def __init__(self, pin):
+        self.pin = pin
+        self.direction = Direction.INPUT
+        self.pull = None
+        self.writes = 0
+        self._value = False
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self.writes += 1
+        self._value = value
+
+    def deinit(self):
+        pass
@@ -0,0 +1,42 @@
+# Stand-in for libSensors: one simulated AHT21-like sensor returning the
+# same dictionary format as the real driver wrappers.
+import random
+
+libSensors_version = "sim"
+
+def overclock(flag):
+    pass
+
+class FakeEnvSensor:
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def temperature(self):
+        return 21.0 + random.uniform(-0.2, 0.2)
+
+    @property
+    def relative_humidity(self):
+        return 45.0 + random.uniform(-1.0, 1.0)
+
+class SensorDevices:
+    def __init__(self):
+        self.version = libSensors_version
+
+    def initSensor(self, envSensor_name, pins):
+        if envSensor_name is None:
+            return None
+        return FakeEnvSensor(envSensor_name)
+
+    def getSensorData(self, envSensor, envSensor_name, correct_temp):
+        t = envSensor.temperature
+        rh = envSensor.relative_humidity
+        return {'temperature': f"{round(t, 1)}",
+                'RH': f"{round(rh, 1)}",
+                'pressure': "--",
+                'IAQ': '--',
+                'TVOC': '--',
+                'eCO2': '--',
+                'HI': f"{round(t, 1)}",
+                'type': 'sensor',
+                'libSensors_version': libSensors_version}
@@ -0,0 +1,15 @@
+# Stand-in for the CircuitPython microcontroller module.
+import random
+
+class Processor:
+    frequency = 133_000_000
+
+    @property
+    def temperature(self):
+        return 27.0 + random.uniform(-0.3, 0.3)
+
+cpu = Processor()
+
+def reset():
+    # Ends the hub thread; the harness reports it and stops.
+    raise SystemExit("microcontroller.reset()")
@@ -0,0 +1,41 @@
+# Stand-in for the CircuitPython socketpool module, backed by CPython sockets.
+# ADDRESS_MAP redirects the addresses the hub uses (its own port 80, the
+# remote sensors' IPs) to local ports chosen by the harness.
+import socket
+
+ADDRESS_MAP = {}
+
+def _map(address):
+    return ADDRESS_MAP.get(tuple(address), address)
+
+class SimSocket(socket.socket):
+    def bind(self, address):
+        return super().bind(_map(address))
+
+    def connect(self, address):
+        return super().connect(_map(address))
+
+    def connect_ex(self, address):
+        return super().connect_ex(_map(address))
+
+class SocketPool:
+    AF_INET = socket.AF_INET
+    SOCK_STREAM = socket.SOCK_STREAM
+    SOCK_DGRAM = socket.SOCK_DGRAM
+    SOL_SOCKET = socket.SOL_SOCKET
+    SO_REUSEADDR = socket.SO_REUSEADDR
+    SO_BROADCAST = socket.SO_BROADCAST
+    IPPROTO_TCP = socket.IPPROTO_TCP
+    IPPROTO_UDP = socket.IPPROTO_UDP
+    TCP_NODELAY = socket.TCP_NODELAY
+    EAI_NONAME = socket.EAI_NONAME
+
+    def __init__(self, radio):
+        self.radio = radio
+
+    def socket(self, family=socket.AF_INET, type=socket.SOCK_STREAM, proto=0):
+        return SimSocket(family, type, proto)
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        host, port = _map((host, port))
+        return socket.getaddrinfo(host, port, family, type, proto, flags)
@@ -0,0 +1,10 @@
+# Stand-in for the CircuitPython supervisor module.
+
+class Runtime:
+    safe_mode_reason = None
+    serial_connected = True
+
+runtime = Runtime()
+
+def reload():
+    raise SystemExit("supervisor.reload()")
@@ -0,0 +1,21 @@
+# Stand-in for the CircuitPython wifi module: always connected on loopback.
+
+class Radio:
+    def __init__(self):
+        self.enabled = True
+        self.connected = True
+        self.ipv4_address = "127.0.0.1"
+        self.ipv4_subnet = "255.0.0.0"
+        self.mac_address = bytes((0x28, 0xcd, 0xc1, 0x00, 0x00, 0x01))
+        self.hostname = "picogarageopener-sim"
+
+    def connect(self, ssid, password, timeout=None):
+        self.connected = True
+
+    def stop_station(self):
+        self.connected = False
+
+    def start_station(self):
+        pass
+
+radio = Radio()
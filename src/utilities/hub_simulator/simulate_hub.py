@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# **********************************************
+# * PicoGarageOpener - Hub simulator and benchmark
+# * Host side (CPython)
+# * v2026.10.18.1
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+'''
+Runs the real src/hub/code.py under CPython, with the CircuitPython
+hardware modules replaced by the stand-ins in fakes/ and the remote
+sensors replaced by local HTTP servers. The hub is then loaded with
+concurrent simulated dashboards, one route at a time, and the latency
+percentiles, throughput and peak Python memory of the hub are reported.
+
+    pip install -r requirements.txt
+    python3 simulate_hub.py                       # default routes
+    python3 simulate_hub.py -c 16 -n 400          # 16 clients, 400 requests per route
+    python3 simulate_hub.py --routes /api/status/all --remote-delay 0.2 --remote-down 1
+    python3 simulate_hub.py --slow-clients 2        # phones on a weak link in the background
+    python3 simulate_hub.py --json results.json   # keep results to compare runs
+
+adafruit_httpserver and adafruit_requests are the real libraries from PyPI.
+Numbers are for a desktop CPU: compare runs against each other, not against
+the Pico. Memory is the tracemalloc peak of the hub process while a route
+is under load, above the level before the route started.
+'''
+
+version = "2026.10.18.1"
+
+import os
+import sys
+import gc
+import json
+import time
+import socket
+import tomllib
+import argparse
+import threading
+import subprocess
+import tracemalloc
+import contextlib
+import http.client
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HUB_DIR = os.path.normpath(os.path.join(HERE, "..", "..", "hub"))
+FAKES_DIR = os.path.join(HERE, "fakes")
+
+DEFAULT_ROUTES = ["/", "/manifest.json", "/icon192.png", "/api/status?device_id=loc",
+                  "/api/status/all", "/api/history"]
+REMOTE_IPS = ["10.0.0.11", "10.0.0.12", "10.0.0.13"]
+
+############################
+# Fake remote sensors
+############################
+class RemoteHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    location = "Remote"
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        body = json.dumps({
+            "state": "CLOSED",
+            "temperature": "19.5",
+            "RH": "50.0",
+            "pressure": "--",
+            "HI": "19.5",
+            "IAQ": "--",
+            "TVOC": "--",
+            "eCO2": "--",
+            "type": "sensor",
+            "libSensors_version": "sim",
+            "location": self.location,
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_remote(index, delay):
+    handler = type("Remote%dHandler" % index, (RemoteHandler,),
+                   {"delay": delay, "location": "Remote %d" % index})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+def closed_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+############################
+# Hub under test
+############################
+def load_settings(overrides):
+    with open(os.path.join(HUB_DIR, "settings.toml"), "rb") as f:
+        settings = tomllib.load(f)
+    settings.update(overrides)
+    for key, value in settings.items():
+        os.environ[key] = str(value)
+
+def start_hub(args, hub_port, log):
+    sys.path.insert(0, FAKES_DIR)
+    import socketpool
+
+    mapping = {("127.0.0.1", 80): ("127.0.0.1", hub_port)}
+    for i, ip in enumerate(REMOTE_IPS[:args.remotes]):
+        if i < args.remote_down:
+            mapping[(ip, 80)] = ("127.0.0.1", closed_port())
+        else:
+            mapping[(ip, 80)] = ("127.0.0.1", start_remote(i, args.remote_delay))
+    socketpool.ADDRESS_MAP.update(mapping)
+
+    load_settings({
+        "remote_sensor_ip": ",".join(REMOTE_IPS[:args.remotes]),
+        "sonar_location": "loc",
+        "history_log": "False",
+        "overclock": "False",
+    })
+    # gc.mem_free() only exists on CircuitPython
+    gc.mem_free = lambda: args.mem_free
+
+    def run():
+        os.chdir(HUB_DIR)
+        try:
+            with contextlib.redirect_stdout(log):
+                import runpy
+                runpy.run_path(os.path.join(HUB_DIR, "code.py"), run_name="__main__")
+        except SystemExit as e:
+            print(f"Hub stopped: {e}", file=sys.stderr)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    deadline = time.monotonic() + args.boot_timeout
+    while time.monotonic() < deadline:
+        if not thread.is_alive():
+            raise RuntimeError("hub exited during boot, see the hub log")
+        # A full request: adafruit_httpserver waits forever on a connection
+        # closed before the request headers arrive
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", hub_port, timeout=5)
+            conn.request("GET", "/api/run/status")
+            conn.getresponse().read()
+            conn.close()
+            return thread
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("hub did not start listening in time")
+
+############################
+# Slow clients
+############################
+# A client on a weak link: drip-feeds its request, then reads the
+# response a little at a time, over and over until stopped.
+def slow_client(port, route, stop):
+    request = f"GET {route} HTTP/1.1\r\nHost: hub\r\nAccept-Encoding: gzip\r\n\r\n".encode()
+    while not stop.is_set():
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=30) as s:
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+                for i in range(0, len(request), 8):
+                    s.sendall(request[i:i + 8])
+                    time.sleep(0.05)
+                while not stop.is_set() and s.recv(256):
+                    time.sleep(0.05)
+        except OSError:
+            time.sleep(0.1)
+
+def start_slow_clients(args, hub_port):
+    stop = threading.Event()
+    for _ in range(args.slow_clients):
+        threading.Thread(target=slow_client, args=(hub_port, args.slow_route, stop), daemon=True).start()
+    return stop
+
+############################
+# Load generator (runs in its own process)
+############################
+def client_worker(port, route, count, timeout, results, lock):
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+            conn.request("GET", route, headers={"Accept-Encoding": "gzip"})
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            results.append(elapsed if ok else None)
+
+def run_client(port, route, concurrency, requests, timeout):
+    results = []
+    lock = threading.Lock()
+    per_client = [requests // concurrency + (1 if i < requests % concurrency else 0)
+                  for i in range(concurrency)]
+    threads = [threading.Thread(target=client_worker, args=(port, route, n, timeout, results, lock))
+               for n in per_client]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {"wall": time.perf_counter() - start, "latencies": results}
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+def bench_route(args, hub_port, hub_thread, route):
+    gc.collect()
+    base = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--client",
+                          "--port", str(hub_port), "--routes", route,
+                          "-c", str(args.concurrency), "-n", str(args.requests),
+                          "--timeout", str(args.timeout)],
+                         capture_output=True, text=True, check=True)
+    peak = tracemalloc.get_traced_memory()[1]
+    if not hub_thread.is_alive():
+        raise RuntimeError(f"hub stopped while serving {route}")
+
+    data = json.loads(out.stdout)
+    ok = sorted(v for v in data["latencies"] if v is not None)
+    return {
+        "route": route,
+        "requests": len(data["latencies"]),
+        "errors": len(data["latencies"]) - len(ok),
+        "p50_ms": ms(percentile(ok, 50)),
+        "p95_ms": ms(percentile(ok, 95)),
+        "p99_ms": ms(percentile(ok, 99)),
+        "req_s": round(len(ok) / data["wall"], 1),
+        "peak_kb": round((peak - base) / 1024, 1),
+    }
+
+def ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+def print_report(results, out):
+    columns = ("route", "requests", "errors", "p50_ms", "p95_ms", "p99_ms", "req_s", "peak_kb")
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)), file=out)
+    for r in results:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(columns, widths)), file=out)
+
+############################
+# Main
+############################
+def main():
+    parser = argparse.ArgumentParser(description="Simulate and benchmark the PicoGarageOpener hub v."+version)
+    parser.add_argument("--routes", nargs="+", default=DEFAULT_ROUTES, help="routes to load, in order")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="simulated dashboards per route")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--timeout", type=float, default=10.0, help="client timeout in seconds")
+    parser.add_argument("--remotes", type=int, default=3, choices=range(0, len(REMOTE_IPS) + 1),
+                        help="number of fake remote sensors")
+    parser.add_argument("--remote-delay", type=float, default=0.05, help="fake remote response time (s)")
+    parser.add_argument("--remote-down", type=int, default=0, help="how many remotes refuse connections")
+    parser.add_argument("--slow-clients", type=int, default=0, help="slow clients running during the load")
+    parser.add_argument("--slow-route", default="/icon192.png", help="route the slow clients request")
+    parser.add_argument("--mem-free", type=int, default=120000, help="value reported by gc.mem_free()")
+    parser.add_argument("--boot-timeout", type=float, default=30.0, help="seconds to wait for the hub")
+    parser.add_argument("--log", default=os.devnull, help="file for the hub's console output")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--client", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        json.dump(run_client(args.port, args.routes[0], args.concurrency, args.requests, args.timeout),
+                  sys.stdout)
+        return
+
+    # The hub thread redirects sys.stdout to the log
+    stdout = sys.stdout
+    hub_port = closed_port()
+    tracemalloc.start()
+    with open(args.log, "w") as log:
+        print(f"Starting hub on 127.0.0.1:{hub_port}...", file=sys.stderr)
+        hub_thread = start_hub(args, hub_port, log)
+        slow = start_slow_clients(args, hub_port)
+        results = []
+        for route in args.routes:
+            print(f"Loading {route} ({args.concurrency} clients, {args.requests} requests)",
+                  file=sys.stderr)
+            results.append(bench_route(args, hub_port, hub_thread, route))
+        slow.set()
+
+    print_report(results, stdout)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"version": version, "args": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    sys.exit(main())